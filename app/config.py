@@ -16,5 +16,125 @@ DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT")
 DB_NAME = os.environ.get("DB_NAME")
 DB_USER = os.environ.get("DB_USER")
-DB_PASSWORD = urllib.parse.quote(os.environ.get("DB_PASSWORD"))
-# end .env
\ No newline at end of file
+DB_PASSWORD = urllib.parse.quote(os.environ.get("DB_PASSWORD", ""))
+# end .env
+
+# Token verification
+KEYCLOAK_JWKS_TTL = int(os.environ.get("KEYCLOAK_JWKS_TTL", 3600))
+KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL = int(os.environ.get("KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL", 30))
+
+# Token validation: "introspect", "local" or "local_with_fallback"
+KEYCLOAK_TOKEN_VALIDATION_MODE = os.environ.get("KEYCLOAK_TOKEN_VALIDATION_MODE", "introspect")
+KEYCLOAK_ISSUER = os.environ.get("KEYCLOAK_ISSUER", f"{KEYCLOAK_SERVER_URL}/realms/{KEYCLOAK_REALM}")
+KEYCLOAK_ALLOWED_AZP = [
+    azp.strip() for azp in os.environ.get("KEYCLOAK_ALLOWED_AZP", KEYCLOAK_CLIENT_ID or "").split(",") if azp.strip()
+]
+KEYCLOAK_INTROSPECTION_CACHE_TTL = int(os.environ.get("KEYCLOAK_INTROSPECTION_CACHE_TTL", 60))
+KEYCLOAK_INTROSPECTION_CACHE_SIZE = int(os.environ.get("KEYCLOAK_INTROSPECTION_CACHE_SIZE", 10000))
+
+# Revocation index: logged-out sessions (sid) and tokens (jti) rejected by local validation.
+# Sessions are remembered for the realm's Access Token Lifespan, after which their access tokens have expired.
+KEYCLOAK_ACCESS_TOKEN_LIFESPAN = int(os.environ.get("KEYCLOAK_ACCESS_TOKEN_LIFESPAN", 300))
+REVOCATION_BUCKET_SECONDS = int(os.environ.get("REVOCATION_BUCKET_SECONDS", 60))
+# Optional Bloom filter in front of the exact index (0: disabled), e.g. 1048576 bits for ~100k entries
+REVOCATION_BLOOM_BITS = int(os.environ.get("REVOCATION_BLOOM_BITS", 0))
+REVOCATION_BLOOM_HASHES = int(os.environ.get("REVOCATION_BLOOM_HASHES", 4))
+
+# Service account token
+KEYCLOAK_ADMIN_TOKEN_REFRESH_MARGIN = int(os.environ.get("KEYCLOAK_ADMIN_TOKEN_REFRESH_MARGIN", 30))
+
+# Keycloak HTTP client
+KEYCLOAK_HTTP_POOL_SIZE = int(os.environ.get("KEYCLOAK_HTTP_POOL_SIZE", 20))
+KEYCLOAK_HTTP_CONNECT_TIMEOUT = float(os.environ.get("KEYCLOAK_HTTP_CONNECT_TIMEOUT", 3))
+KEYCLOAK_HTTP_READ_TIMEOUT = float(os.environ.get("KEYCLOAK_HTTP_READ_TIMEOUT", 10))
+KEYCLOAK_HTTP_RETRIES = int(os.environ.get("KEYCLOAK_HTTP_RETRIES", 3))
+KEYCLOAK_HTTP_BACKOFF_FACTOR = float(os.environ.get("KEYCLOAK_HTTP_BACKOFF_FACTOR", 0.2))
+
+# Database connection pool
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Full SQLAlchemy URLs overriding the DB_* settings, e.g. a local SQLite file for benchmarks
+DATABASE_URL = os.environ.get("DATABASE_URL")
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL")
+
+# Read replicas: comma-separated sync SQLAlchemy URLs. The async URLs are derived
+# (postgresql -> postgresql+asyncpg) unless ASYNC_DB_REPLICA_URLS lists them in the same order.
+DB_REPLICA_URLS = [url.strip() for url in os.environ.get("DB_REPLICA_URLS", "").split(",") if url.strip()]
+ASYNC_DB_REPLICA_URLS = [url.strip() for url in os.environ.get("ASYNC_DB_REPLICA_URLS", "").split(",") if url.strip()]
+# Reads of a caller (or about a user) go to the primary for this long after a write
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", 5))
+# A replica that failed to connect is skipped for this long
+DB_REPLICA_RETRY_INTERVAL = float(os.environ.get("DB_REPLICA_RETRY_INTERVAL", 10))
+
+# Bulk user provisioning
+USERS_BULK_MAX_BATCH = int(os.environ.get("USERS_BULK_MAX_BATCH", 1000))
+KEYCLOAK_BULK_CONCURRENCY = int(os.environ.get("KEYCLOAK_BULK_CONCURRENCY", 10))
+
+# Batch user lookup (POST /users/lookup)
+USERS_LOOKUP_MAX_IDS = int(os.environ.get("USERS_LOOKUP_MAX_IDS", 5000))
+
+# Bulk role assignment (POST/DELETE /roles/{role_id}/users)
+ROLE_USERS_MAX_IDS = int(os.environ.get("ROLE_USERS_MAX_IDS", 10000))
+
+# User export
+USERS_EXPORT_BATCH_SIZE = int(os.environ.get("USERS_EXPORT_BATCH_SIZE", 1000))
+
+# Role catalog cache
+ROLE_CATALOG_CACHE_TTL = int(os.environ.get("ROLE_CATALOG_CACHE_TTL", 300))
+
+# Service account clients (comma-separated client ids, default none) whose client credentials
+# tokens are granted every capability. Set it only to bootstrap the first role assignments.
+AUTHZ_SERVICE_ACCOUNT_CLIENTS = [
+    client.strip() for client in os.environ.get("AUTHZ_SERVICE_ACCOUNT_CLIENTS", "").split(",") if client.strip()
+]
+
+# Capability (permission) cache. Changes are published to every worker through a shared cache
+# backend (CACHE_BACKEND_URL); without one, other workers see a change after at most the TTL.
+PERMISSION_CACHE_TTL = int(os.environ.get("PERMISSION_CACHE_TTL", 300 if os.environ.get("CACHE_BACKEND_URL") else 5))
+PERMISSION_CACHE_SIZE = int(os.environ.get("PERMISSION_CACHE_SIZE", 100000))
+
+# Login user status cache (the size bounds the near cache of a shared backend)
+USER_STATUS_CACHE_SIZE = int(os.environ.get("USER_STATUS_CACHE_SIZE", 100000))
+USER_STATUS_CACHE_TTL = int(os.environ.get("USER_STATUS_CACHE_TTL", 300))
+USER_STATUS_NEGATIVE_TTL = int(os.environ.get("USER_STATUS_NEGATIVE_TTL", 30))
+
+# Login throttling: token buckets per client IP and per username from that IP
+LOGIN_RATE_LIMIT_ENABLED = os.environ.get("LOGIN_RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+LOGIN_RATE_LIMIT_USERNAME_BURST = int(os.environ.get("LOGIN_RATE_LIMIT_USERNAME_BURST", 5))
+LOGIN_RATE_LIMIT_USERNAME_PER_MINUTE = float(os.environ.get("LOGIN_RATE_LIMIT_USERNAME_PER_MINUTE", 5))
+LOGIN_RATE_LIMIT_IP_BURST = int(os.environ.get("LOGIN_RATE_LIMIT_IP_BURST", 20))
+LOGIN_RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get("LOGIN_RATE_LIMIT_IP_PER_MINUTE", 60))
+LOGIN_RATE_LIMIT_MAX_KEYS = int(os.environ.get("LOGIN_RATE_LIMIT_MAX_KEYS", 100000))
+# Shared backend for multi-worker deployments, e.g. redis://localhost:6379/0
+LOGIN_RATE_LIMIT_REDIS_URL = os.environ.get("LOGIN_RATE_LIMIT_REDIS_URL")
+LOGIN_RATE_LIMIT_TRUST_FORWARDED_FOR = os.environ.get("LOGIN_RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+
+# Shared cache for the service account token, JWKS and user status.
+# Unset: each worker caches in process. redis://...: one cache shared by every worker.
+CACHE_BACKEND_URL = os.environ.get("CACHE_BACKEND_URL")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 100000))
+# Per-worker near cache in front of the shared backend, kept coherent by invalidation messages
+CACHE_LOCAL_TTL = int(os.environ.get("CACHE_LOCAL_TTL", 30))
+# How long other workers wait for the one computing a missing entry
+CACHE_LOCK_TIMEOUT = float(os.environ.get("CACHE_LOCK_TIMEOUT", 5))
+
+# Startup warm-up: prefetch JWKS, the service account token and DB connections in each worker
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+STARTUP_WARMUP_TIMEOUT = float(os.environ.get("STARTUP_WARMUP_TIMEOUT", 10))
+STARTUP_WARMUP_DB_CONNECTIONS = int(os.environ.get("STARTUP_WARMUP_DB_CONNECTIONS", DB_POOL_SIZE))
+
+# Workers serving the app, exported by gunicorn.conf.py. Set it when starting workers another way.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Keycloak -> database sync of email verification and deleted users (opt-in). Runs in the background of
+# each worker: on a shared cache backend one worker at a time holds the sync lease; without one it only
+# runs with a single worker.
+USER_SYNC_ENABLED = os.environ.get("USER_SYNC_ENABLED", "false").lower() in ("1", "true", "yes")
+USER_SYNC_INTERVAL = float(os.environ.get("USER_SYNC_INTERVAL", 5))
+# Full reconciliation against the users API, also run when no event high-water mark is stored (0: only then)
+USER_SYNC_FULL_INTERVAL = int(os.environ.get("USER_SYNC_FULL_INTERVAL", 3600))
+USER_SYNC_PAGE_SIZE = int(os.environ.get("USER_SYNC_PAGE_SIZE", 100))
@@ -0,0 +1,83 @@
+import uuid
+from sqlalchemy import any_, bindparam, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.user import Role, User, UserRole
+
+
+def get_roles_with_capabilities(session: Session):
+    # Two statements regardless of the number of roles: roles, then all their capabilities
+    return session.query(Role).options(selectinload(Role.capabilities)).all()
+
+
+def _uuid_array(name: str, values: list):
+    # One array parameter (= ANY(:name)) however many ids there are
+    return bindparam(name, values, type_=ARRAY(UUID(as_uuid=True)))
+
+
+async def _active_role_id(session: AsyncSession, role_id) -> uuid.UUID:
+    role_id = uuid.UUID(str(role_id))
+    result = await session.execute(select(Role.id).filter(Role.id == role_id, Role.deleted_at == None))
+    if result.scalar() is None:
+        raise ValueError("Role not found")
+    return role_id
+
+
+async def _active_user_ids(session: AsyncSession, user_ids: list) -> set:
+    result = await session.execute(
+        select(User.id).filter(User.id == any_(_uuid_array("user_ids", user_ids)), User.deleted_at == None)
+    )
+    return set(result.scalars().all())
+
+
+async def add_role_users_async(session: AsyncSession, role_id, user_ids: list) -> dict:
+    """
+    Give a role to many users with one INSERT ... SELECT ... ON CONFLICT ON
+    CONSTRAINT user_role_unique DO NOTHING. Users that already have the role
+    are skipped, ids without a non-deleted user are missing.
+    """
+    role_id = await _active_role_id(session, role_id)
+    user_ids = list(dict.fromkeys(uuid.UUID(str(user_id)) for user_id in user_ids))
+    found = await _active_user_ids(session, user_ids)
+
+    added = []
+    if found:
+        rows = select(func.gen_random_uuid(), User.id, literal(role_id, UUID(as_uuid=True))).filter(
+            User.id == any_(_uuid_array("found_ids", list(found))),
+            User.deleted_at == None,
+        )
+        result = await session.execute(
+            insert(UserRole)
+            .from_select(["id", "user_id", "role_id"], rows, include_defaults=False)
+            .on_conflict_do_nothing(constraint="user_role_unique")
+            .returning(UserRole.user_id)
+        )
+        added = result.scalars().all()
+    await session.commit()
+
+    return {"added": len(added), "skipped": len(found) - len(added), "missing": len(user_ids) - len(found)}
+
+
+async def remove_role_users_async(session: AsyncSession, role_id, user_ids: list) -> dict:
+    """
+    Take a role from many users with one DELETE. Users that didn't have the
+    role are skipped, ids without a non-deleted user are missing.
+    """
+    role_id = await _active_role_id(session, role_id)
+    user_ids = list(dict.fromkeys(uuid.UUID(str(user_id)) for user_id in user_ids))
+    found = await _active_user_ids(session, user_ids)
+
+    removed = []
+    if found:
+        result = await session.execute(
+            delete(UserRole)
+            .filter(UserRole.role_id == role_id, UserRole.user_id == any_(_uuid_array("found_ids", list(found))))
+            .returning(UserRole.user_id),
+            execution_options={"synchronize_session": False},
+        )
+        removed = result.scalars().all()
+    await session.commit()
+
+    return {"removed": len(removed), "skipped": len(found) - len(removed), "missing": len(user_ids) - len(found)}
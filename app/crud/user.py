@@ -1,13 +1,52 @@
 import uuid
-import requests
 from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import Float, and_, any_, bindparam, case, cast, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.user import User
-from app.schemas.user import UserCreate, UserRead, UserUpdate
+from app.config import USER_STATUS_CACHE_SIZE, USER_STATUS_CACHE_TTL, USER_STATUS_NEGATIVE_TTL
+from app.crud.pagination import encode_cursor, decode_cursor
+from app.database import read_session, read_your_writes
+from app.models.user import User, USER_SEARCH_DOCUMENT
+from app.schemas.user import UserRead
+from app.services.conditional import PreconditionFailed, etag_matches_strong, updated_at_etag
+from app.services.cache import Cache, cache_backend
 
-def create_user(
-    session: Session,
+# keycloak_id -> {"deleted", "email_verified"}, read on every login.
+# Unknown users are cached as negative entries for a shorter time.
+user_status_cache = Cache(
+    cache_backend,
+    "user-status",
+    ttl=USER_STATUS_CACHE_TTL,
+    negative_ttl=USER_STATUS_NEGATIVE_TTL,
+    local_maxsize=USER_STATUS_CACHE_SIZE,
+)
+
+
+def invalidate_user_status(keycloak_id):
+    user_status_cache.invalidate(str(keycloak_id))
+    # Reload it from the primary until replicas have the change
+    read_your_writes.mark(f"user:{keycloak_id}")
+
+
+# List endpoints select only the UserRead columns and validate the page as one list
+USER_READ_COLUMNS = [getattr(User, field) for field in UserRead.model_fields]
+# Enough to page like USER_READ_COLUMNS and compute the page ETag
+USER_VERSION_COLUMNS = [User.id, User.created_at, User.updated_at]
+user_list_adapter = TypeAdapter(List[UserRead])
+
+
+def dump_users_json(rows) -> bytes:
+    """
+    Validate rows of `USER_READ_COLUMNS` once, as a list, and encode them straight to JSON bytes.
+    """
+    return user_list_adapter.dump_json(user_list_adapter.validate_python([row._asdict() for row in rows]))
+
+
+async def create_user_async(
+    session: AsyncSession,
     username: str,
     first_name: str,
     last_name: str,
@@ -15,10 +54,12 @@ def create_user(
     phone_number: str,
     keycloak_id: str,
 ) -> UserRead:
+    keycloak_id = uuid.UUID(str(keycloak_id))
 
-    existing_user = session.query(User).filter(
-        (User.keycloak_id == keycloak_id)
-    ).first()
+    result = await session.execute(
+        select(User).filter(User.keycloak_id == keycloak_id)
+    )
+    existing_user = result.scalars().first()
 
     if existing_user:
         if existing_user.deleted_at:
@@ -28,14 +69,13 @@ def create_user(
             existing_user.last_name = last_name
             existing_user.phone_number = phone_number
             existing_user.email_verified = False
-            session.commit()
-            session.refresh(existing_user)
+            await session.commit()
+            await session.refresh(existing_user)
+            invalidate_user_status(keycloak_id)
             return UserRead.model_validate(existing_user)
         else:
-            # User exists and is not deleted - raise error or handle as needed
             raise ValueError("User already exists")
 
-    # Store user in PostgreSQL
     user = User(
         id=uuid.uuid4(),
         keycloak_id=keycloak_id,
@@ -46,33 +86,336 @@ def create_user(
         phone_number=phone_number
     )
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    invalidate_user_status(keycloak_id)
 
     return UserRead.model_validate(user)
 
 
-def get_user(session: Session, user_id: str):
-    user = session.query(User).filter(User.id == user_id, User.deleted_at == None).first()
+async def bulk_create_users_async(session: AsyncSession, users: list) -> tuple:
+    """
+    Insert many users with one multi-row INSERT ... ON CONFLICT (keycloak_id) DO NOTHING.
+    Soft-deleted users are undeleted with one batched UPDATE, like `create_user_async`.
+    Returns the created users and the rejected records (email or phone number
+    taken by another user), both keyed by keycloak_id; users missing from both
+    already exist.
+    """
+    if not users:
+        return {}, {}
+
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "keycloak_id": uuid.UUID(str(user["keycloak_id"])),
+            "username": user["username"],
+            "first_name": user["first_name"],
+            "last_name": user["last_name"],
+            "email": user["email"],
+            "phone_number": user["phone_number"],
+            "email_verified": False,
+        }
+        for user in users
+    ]
+
+    # Email and phone number are unique too: records that would take another
+    # user's are rejected here, so only keycloak_id conflicts reach ON CONFLICT
+    result = await session.execute(
+        select(User.keycloak_id, User.email, User.phone_number, User.deleted_at).filter(
+            or_(
+                User.keycloak_id.in_([row["keycloak_id"] for row in rows]),
+                User.email.in_([row["email"] for row in rows]),
+                User.phone_number.in_([row["phone_number"] for row in rows]),
+            )
+        )
+    )
+    existing = result.all()
+    active_ids = {user.keycloak_id for user in existing if user.deleted_at is None}
+    owners = {}
+    for user in existing:
+        owners[("email", user.email)] = user.keycloak_id
+        owners[("phone number", user.phone_number)] = user.keycloak_id
+
+    accepted, rejected = [], {}
+    for row in rows:
+        if row["keycloak_id"] in active_ids:
+            accepted.append(row)
+            continue
+        fields = {"email": row["email"], "phone number": row["phone_number"]}
+        taken = [
+            field for field, value in fields.items()
+            if owners.get((field, value), row["keycloak_id"]) != row["keycloak_id"]
+        ]
+        if taken:
+            rejected[str(row["keycloak_id"])] = f"{' and '.join(taken).capitalize()} already in use"
+            continue
+        for field, value in fields.items():
+            owners[(field, value)] = row["keycloak_id"]
+        accepted.append(row)
+    rows = accepted
+
+    created = {}
+    if rows:
+        result = await session.scalars(
+            insert(User).values(rows).on_conflict_do_nothing(index_elements=[User.keycloak_id]).returning(User)
+        )
+        created = {user.keycloak_id: user for user in result.all()}
+
+    # Conflicting rows that belong to soft-deleted users are restored
+    conflicts = {row["keycloak_id"]: row for row in rows if row["keycloak_id"] not in created}
+    if conflicts:
+        result = await session.execute(
+            select(User.keycloak_id).filter(
+                User.keycloak_id.in_(list(conflicts)),
+                User.deleted_at != None,
+            )
+        )
+        deleted_ids = result.scalars().all()
+        if deleted_ids:
+            await session.execute(
+                update(User.__table__)
+                .where(User.__table__.c.keycloak_id == bindparam("b_keycloak_id"))
+                .values(
+                    deleted_at=None,
+                    first_name=bindparam("b_first_name"),
+                    last_name=bindparam("b_last_name"),
+                    phone_number=bindparam("b_phone_number"),
+                    email_verified=False,
+                ),
+                [
+                    {
+                        "b_keycloak_id": keycloak_id,
+                        "b_first_name": conflicts[keycloak_id]["first_name"],
+                        "b_last_name": conflicts[keycloak_id]["last_name"],
+                        "b_phone_number": conflicts[keycloak_id]["phone_number"],
+                    }
+                    for keycloak_id in deleted_ids
+                ],
+            )
+            result = await session.scalars(
+                select(User).filter(User.keycloak_id.in_(deleted_ids))
+            )
+            created.update({user.keycloak_id: user for user in result.all()})
+
+    await session.commit()
+    for keycloak_id in created:
+        invalidate_user_status(keycloak_id)
+
+    created = {str(keycloak_id): UserRead.model_validate(user) for keycloak_id, user in created.items()}
+    return created, rejected
+
+
+async def get_user_async(session: AsyncSession, user_id: str, for_update: bool = False):
+    query = select(User).filter(User.id == user_id, User.deleted_at == None)
+    if for_update:
+        query = query.with_for_update()
+    result = await session.execute(query)
+    user = result.scalars().first()
     if not user:
         raise ValueError("User not found")
-    
+
     return user
 
 
-def update_user(
-    session: Session,
+async def get_user_updated_at_async(session: AsyncSession, user_id: str) -> datetime:
+    """
+    Version of a user for conditional requests: only `updated_at` is read.
+    """
+    result = await session.execute(
+        select(User.updated_at).filter(User.id == user_id, User.deleted_at == None)
+    )
+    updated_at = result.scalar()
+    if updated_at is None:
+        raise ValueError("User not found")
+
+    return updated_at
+
+
+async def get_users_by_ids_async(session: AsyncSession, ids: list, key: str = "id") -> list:
+    """
+    Non-deleted users whose `key` ("id" or "keycloak_id") is in `ids`, as rows
+    of `USER_READ_COLUMNS`. The ids are sent as one array parameter
+    (`= ANY($1)`), so the statement is the same for any number of ids.
+    """
+    column = getattr(User, key)
+    ids = bindparam("ids", [uuid.UUID(str(value)) for value in ids], type_=ARRAY(column.type))
+    result = await session.execute(
+        select(*USER_READ_COLUMNS).filter(column == any_(ids), User.deleted_at == None)
+    )
+    return result.all()
+
+
+async def get_user_status_async(keycloak_id: str) -> tuple:
+    """
+    Return `(exists, deleted, email_verified)` for a Keycloak user, served from
+    the user status cache and loaded with a two-column query on a miss, from a
+    replica unless the user was changed recently.
+    """
+    async def load():
+        async with read_session(f"user:{keycloak_id}") as session:
+            result = await session.execute(
+                select(User.deleted_at, User.email_verified).filter(User.keycloak_id == uuid.UUID(str(keycloak_id)))
+            )
+            row = result.first()
+        if row is None:
+            return None
+        return {"deleted": row.deleted_at is not None, "email_verified": row.email_verified}
+
+    status = await user_status_cache.get_or_compute(str(keycloak_id), load)
+    if status is None:
+        return False, False, False
+    return True, status["deleted"], status["email_verified"]
+
+
+async def get_users_page_async(
+    session: AsyncSession,
+    page_size: int = 10,
+    cursor: str = None,
+    columns: list = USER_READ_COLUMNS,
+):
+    """
+    Keyset pagination over non-deleted users ordered by (created_at, id).
+    Returns the page as rows of `columns` (which must include id and
+    created_at) and the cursor of the next page (None on the last page).
+    """
+    query = select(*columns).filter(User.deleted_at == None)
+
+    if cursor:
+        created_at, user_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(created_at), uuid.UUID(user_id))
+        except ValueError:
+            raise ValueError("Invalid cursor")
+        query = query.filter(tuple_(User.created_at, User.id) > after)
+
+    query = query.order_by(User.created_at, User.id).limit(page_size + 1)
+    result = await session.execute(query)
+    users = result.all()
+
+    next_cursor = None
+    if len(users) > page_size:
+        users = users[:page_size]
+        next_cursor = encode_cursor(users[-1].created_at.isoformat(), users[-1].id)
+
+    return users, next_cursor
+
+
+async def get_users_offset_async(
+    session: AsyncSession,
+    page: int = 1,
+    page_size: int = 10,
+    columns: list = USER_READ_COLUMNS,
+):
+    """
+    Legacy offset pagination over non-deleted users, as rows of `columns`.
+    Gets slower with page depth, prefer `get_users_page_async`.
+    """
+    query = select(*columns).filter(User.deleted_at == None)
+    result = await session.execute(query.offset((page - 1) * page_size).limit(page_size))
+    return result.all()
+
+
+def _search_rank(q: str):
+    """
+    3 for an exact username, email or phone match, 2 for a prefix of any searched
+    field, 1 for a substring, plus the word similarity of `q` to the document.
+    """
+    fields = [func.lower(User.username), func.lower(User.first_name), func.lower(User.last_name),
+              func.lower(User.email), User.phone_number]
+    tier = case(
+        (or_(fields[0] == q, fields[3] == q, fields[4] == q), 3),
+        (or_(*[field.startswith(q, autoescape=True) for field in fields]), 2),
+        (USER_SEARCH_DOCUMENT.contains(q, autoescape=True), 1),
+        else_=0,
+    )
+    return cast(tier + func.word_similarity(q, USER_SEARCH_DOCUMENT), Float)
+
+
+async def search_users_async(session: AsyncSession, q: str, limit: int = 20, cursor: str = None):
+    """
+    Ranked search of non-deleted users by username, name, email or phone.
+    Candidates are rows whose search document contains `q` or is similar to it
+    (both served by the trigram index), ordered by `_search_rank` then id.
+    Returns rows of `USER_READ_COLUMNS` plus `rank`, and the next page cursor.
+    """
+    q = q.strip().lower()
+    rank = _search_rank(q).label("rank")
+    query = select(*USER_READ_COLUMNS, rank).filter(
+        User.deleted_at == None,
+        or_(
+            USER_SEARCH_DOCUMENT.contains(q, autoescape=True),
+            USER_SEARCH_DOCUMENT.bool_op("%>")(q),
+        ),
+    )
+
+    if cursor:
+        after_rank, user_id = decode_cursor(cursor, 2)
+        try:
+            after_rank, user_id = float(after_rank), uuid.UUID(user_id)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+        query = query.filter(or_(rank < after_rank, and_(rank == after_rank, User.id > user_id)))
+
+    query = query.order_by(rank.desc(), User.id).limit(limit + 1)
+    result = await session.execute(query)
+    users = result.all()
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(repr(users[-1].rank), users[-1].id)
+
+    return users, next_cursor
+
+
+async def stream_users_async(
+    session: AsyncSession,
+    columns: list,
+    deleted: bool = None,
+    email_verified: bool = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    batch_size: int = 1000,
+):
+    """
+    Stream user rows (only `columns`) through a server-side cursor.
+    Yields lists of row tuples of at most `batch_size` rows.
+    """
+    query = select(*[getattr(User, column) for column in columns])
+
+    if deleted is True:
+        query = query.filter(User.deleted_at != None)
+    elif deleted is False:
+        query = query.filter(User.deleted_at == None)
+    if email_verified is not None:
+        query = query.filter(User.email_verified == email_verified)
+    if created_from is not None:
+        query = query.filter(User.created_at >= created_from)
+    if created_to is not None:
+        query = query.filter(User.created_at < created_to)
+
+    # No ORDER BY: rows stream in storage order without a sort step
+    result = await session.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+async def update_user_async(
+    session: AsyncSession,
     user_id: str,
     first_name: str = None,
     last_name: str = None,
     phone_number: str = None,
     email_verified: bool = None,
+    if_match: str = None,
 ) -> UserRead:
-    
-    user = get_user(session, user_id)
-    
-    if not user:
-        raise ValueError("User not found")
+    """
+    Update a user. With `if_match`, the row is locked and the update only
+    applies if its current ETag matches, otherwise `PreconditionFailed` is raised.
+    """
+    user = await get_user_async(session, user_id, for_update=if_match is not None)
+    if if_match is not None and not etag_matches_strong(if_match, updated_at_etag(user.updated_at)):
+        raise PreconditionFailed("User was modified since it was read")
 
     if first_name is not None:
         user.first_name = first_name
@@ -80,63 +423,79 @@ def update_user(
         user.last_name = last_name
     if phone_number is not None:
         user.phone_number = phone_number
-    
-    print(f"Updating user {user_id} with email_verified={email_verified}")
     if email_verified is not None:
         user.email_verified = email_verified
 
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    invalidate_user_status(user.keycloak_id)
 
     return UserRead.model_validate(user)
 
 
-def delete_user(session: Session, user_id: str):
+async def delete_user_async(session: AsyncSession, user_id: str):
 
-    user = get_user(session, user_id)
-    if not user:
-        raise ValueError("User not found")
+    user = await get_user_async(session, user_id)
 
     user.deleted_at = datetime.utcnow()
-    session.commit()
+    await session.commit()
+    invalidate_user_status(user.keycloak_id)
 
     return {"msg": "User deleted successfully"}
 
-if __name__ == "__main__":
-
-    from app.database import SessionLocal
-    session = SessionLocal()
-
-    i = 10
-    user_data = {
-        "keycloak_id": "94265738-2719-40ae-91bf-915f44325abb",
-        "username": f"username-{i}",
-        "first_name": f"firstname-{i}",
-        "last_name": f"lastname-{i}",
-        "email": f"email-{i}@gmail.com",
-        "phone_number": "09001234576",
-        "email_verified": True
-    }
-
-    create_user(
-        session, 
-        **user_data
+
+async def get_active_keycloak_ids_async(session: AsyncSession) -> set:
+    """
+    keycloak_ids of every non-deleted user.
+    """
+    result = await session.execute(select(User.keycloak_id).filter(User.deleted_at == None))
+    return set(result.scalars().all())
+
+
+async def apply_keycloak_user_states_async(session: AsyncSession, states: dict) -> dict:
+    """
+    Bring users in line with their Keycloak state. `states` maps keycloak_id to
+    `{"email_verified": bool}`, or to None for users removed from Keycloak,
+    which are soft-deleted. Only rows that differ are written, with one batched
+    UPDATE per kind of change. Returns the number of rows changed per kind.
+    """
+    if not states:
+        return {"email_verified": 0, "deleted": 0}
+
+    states = {uuid.UUID(str(keycloak_id)): state for keycloak_id, state in states.items()}
+    result = await session.execute(
+        select(User.keycloak_id, User.email_verified).filter(
+            User.keycloak_id.in_(list(states)),
+            User.deleted_at == None,
+        )
     )
 
-    # user_data = {
-    #     "first_name": f"firstname-{i}-updated",
-    #     "last_name": f"lastname-{i}-updated",
-    #     "phone_number": "09001234569",
-    #     "email_verified": False
-    # }
-
-    # update_user(
-    #     session, 
-    #     "6b542c1e-830e-445f-b1ba-c0a963794935", 
-    #     **user_data
-    # )
-
-    # delete_user(
-    #     session, 
-    #     "ad757358-f1cc-47d9-b4a2-b6fb7c759659"
-    # )
\ No newline at end of file
+    verified = []
+    removed = []
+    for keycloak_id, email_verified in result.all():
+        state = states[keycloak_id]
+        if state is None:
+            removed.append(keycloak_id)
+        elif state["email_verified"] != email_verified:
+            verified.append({"b_keycloak_id": keycloak_id, "b_email_verified": state["email_verified"]})
+
+    table = User.__table__
+    if verified:
+        await session.execute(
+            update(table)
+            .where(table.c.keycloak_id == bindparam("b_keycloak_id"))
+            .values(email_verified=bindparam("b_email_verified"), updated_at=datetime.utcnow()),
+            verified,
+        )
+    if removed:
+        await session.execute(
+            update(table)
+            .where(table.c.keycloak_id.in_(removed))
+            .values(deleted_at=datetime.utcnow(), updated_at=datetime.utcnow())
+        )
+    await session.commit()
+
+    for keycloak_id in [row["b_keycloak_id"] for row in verified] + removed:
+        invalidate_user_status(keycloak_id)
+
+    return {"email_verified": len(verified), "deleted": len(removed)}
@@ -1,6 +1,15 @@
-from sqlalchemy import create_engine, Column, String, DateTime, func
+import asyncio
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import Request
+from jose import jwt
+from sqlalchemy import create_engine, event, make_url, Column, String, DateTime, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
@@ -9,20 +18,321 @@ from .config import (
     DB_PORT,
     DB_NAME,
     DB_USER,
-    DB_PASSWORD
+    DB_PASSWORD,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    DB_REPLICA_URLS,
+    ASYNC_DB_REPLICA_URLS,
+    DB_REPLICA_STICKY_SECONDS,
+    DB_REPLICA_RETRY_INTERVAL,
 )
+from .services.cache import TTLCache, cache_backend
+
+
+class PoolWaitStats:
+    """
+    Counters for time spent waiting on a pool checkout.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += elapsed
+            self.wait_seconds_max = max(self.wait_seconds_max, elapsed)
+
+
+def _timed_pool_class(base):
+    """
+    Subclass a queue pool so every checkout records how long it waited.
+    The stats live on the class so they survive `pool.recreate()`.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = base._do_get(self)
+        except Exception:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get, "wait_stats": PoolWaitStats()})
+
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
 
 # Database connection
-conn_info = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(conn_info)
+conn_info = DATABASE_URL or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+engine = create_engine(conn_info, poolclass=_timed_pool_class(QueuePool), **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async database connection, used by the async routes
+async_conn_info = ASYNC_DATABASE_URL or f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+async_engine = create_async_engine(
+    async_conn_info,
+    poolclass=_timed_pool_class(AsyncAdaptedQueuePool),
+    **pool_options
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
+
+def _async_url(url: str) -> str:
+    url = make_url(url)
+    drivers = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    return str(url.set(drivername=drivers.get(url.get_backend_name(), url.drivername)))
+
+
+class ReplicaSet:
+    """
+    Round-robin over replica engines. A replica that fails to connect is
+    skipped for `retry_interval` seconds; with none available, reads go to the primary.
+    """
+
+    def __init__(self, engines: list, retry_interval: float = 10):
+        self.engines = engines
+        self.retry_interval = retry_interval
+        self._turn = itertools.count()
+        self._down_until = {}
+
+    def __bool__(self):
+        return bool(self.engines)
+
+    def pick(self):
+        now = time.monotonic()
+        start = next(self._turn)
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            if self._down_until.get(engine, 0) <= now:
+                return engine
+        return None
+
+    def mark_down(self, engine):
+        self._down_until[engine] = time.monotonic() + self.retry_interval
+
+
+class ReadYourWrites:
+    """
+    Remembers keys (a caller, a user) written in the last `window` seconds so
+    their reads go to the primary until replicas have caught up. Shared
+    across workers on a shared cache backend.
+    """
+
+    def __init__(self, backend, window: float, prefix: str = "read-your-writes:"):
+        self.backend = backend
+        self.window = window
+        self.prefix = prefix
+        self.local = TTLCache(maxsize=100000, ttl=window)
+        self._pending = set()
+
+    def mark(self, key: str):
+        if not key or self.window <= 0:
+            return
+        self.local.set(key, True)
+        if self.backend.shared and self.backend.loop is not None:
+            # Sync callers (ORM events, cache invalidation) can't await the backend
+            task = asyncio.run_coroutine_threadsafe(self.backend.set(self.prefix + key, 1, self.window), self.backend.loop)
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def recent(self, *keys) -> bool:
+        keys = [key for key in keys if key]
+        if any(self.local.get(key) for key in keys):
+            return True
+        if self.backend.shared:
+            for key in keys:
+                if await self.backend.get(self.prefix + key) is not None:
+                    return True
+        return False
+
+
+def _replica_engine(url: str, async_engine: bool = False):
+    if async_engine:
+        return create_async_engine(url, poolclass=_timed_pool_class(AsyncAdaptedQueuePool), **pool_options)
+    return create_engine(url, poolclass=_timed_pool_class(QueuePool), **pool_options)
+
+
+replicas = ReplicaSet([_replica_engine(url) for url in DB_REPLICA_URLS], DB_REPLICA_RETRY_INTERVAL)
+async_replicas = ReplicaSet(
+    [_replica_engine(url, async_engine=True) for url in ASYNC_DB_REPLICA_URLS or map(_async_url, DB_REPLICA_URLS)],
+    DB_REPLICA_RETRY_INTERVAL,
+)
+read_your_writes = ReadYourWrites(cache_backend, DB_REPLICA_STICKY_SECONDS)
+
+
+class ReplicaSession(Session):
+    """
+    Session reading from a replica of `replica_set`, picked when the session
+    first needs a connection: sessions that never query (e.g. served from a
+    cache) never check one out. A replica that can't be connected to then is
+    marked down and the session falls back to its bound primary engine.
+    """
+
+    replica_set = None
+
+    def get_bind(self, mapper=None, **kw):
+        if "replica" not in self.info:
+            self.info["replica"] = self._connect_replica()
+        replica = self.info["replica"]
+        if replica is None:
+            return super().get_bind(mapper, **kw)
+        return getattr(replica, "sync_engine", replica)
+
+    def _connect_replica(self):
+        replica = self.replica_set.pick() if self.replica_set else None
+        if replica is None:
+            return None
+        try:
+            # Probe with a pooled connection, returned at once for the session to check out.
+            # Under an AsyncSession this runs in its greenlet, so the async driver can connect.
+            getattr(replica, "sync_engine", replica).connect().close()
+        except Exception:
+            self.replica_set.mark_down(replica)
+            return None
+        return replica
+
+
+class ReplicaReadSession(ReplicaSession):
+    replica_set = replicas
+
+
+class AsyncReplicaReadSession(ReplicaSession):
+    replica_set = async_replicas
+
+
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=ReplicaReadSession)
+AsyncReplicaSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    sync_session_class=AsyncReplicaReadSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def caller_key(request: Request):
+    """
+    Read-your-writes key of the bearer token's subject. The token is not
+    verified here: it only routes reads, authentication happens elsewhere.
+    """
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        try:
+            return "caller:" + jwt.get_unverified_claims(authorization[7:])["sub"]
+        except Exception:
+            pass
+    return None
+
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Dependency to get a read-only DB session on a replica, or the primary without replicas
+def get_read_db():
+    db = ReplicaSessionLocal() if replicas else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dependency to get an async DB session. Writes made through it make
+# the caller's reads stick to the primary for a while
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        finally:
+            if db.info.pop("wrote", False) and async_replicas:
+                read_your_writes.mark(caller_key(request))
+
+
+@asynccontextmanager
+async def read_session(*sticky_keys):
+    """
+    Async session for reads: on a healthy replica unless one of `sticky_keys`
+    was written recently, otherwise on the primary.
+    """
+    on_replica = bool(async_replicas) and not await read_your_writes.recent(*sticky_keys)
+    async with (AsyncReplicaSessionLocal if on_replica else AsyncSessionLocal)() as db:
+        yield db
+
+
+# Dependency to get a read-only async DB session for the calling user
+async def get_async_read_db(request: Request):
+    async with read_session(caller_key(request)) as db:
+        yield db
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_write_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_write_statement(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+def _pool_stats(pool) -> dict:
+    wait_stats = pool.wait_stats
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checkouts": wait_stats.checkouts,
+        "checkout_timeouts": wait_stats.timeouts,
+        "checkout_wait_seconds_total": wait_stats.wait_seconds_total,
+        "checkout_wait_seconds_max": wait_stats.wait_seconds_max,
+    }
+
+
+def get_pool_stats() -> dict:
+    """
+    Current pool usage and checkout waits for the sync and async engines.
+    """
+    stats = {
+        "sync": _pool_stats(engine.pool),
+        "async": _pool_stats(async_engine.sync_engine.pool),
+    }
+    for index, replica in enumerate(replicas.engines):
+        stats[f"sync-replica-{index}"] = _pool_stats(replica.pool)
+    for index, replica in enumerate(async_replicas.engines):
+        stats[f"async-replica-{index}"] = _pool_stats(replica.sync_engine.pool)
+    return stats
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Index, DDL, UniqueConstraint, event, func, literal_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -27,6 +27,44 @@ class User(Base):
         back_populates="users"
     )
 
+    __table_args__ = (
+        # Keyset pagination over non-deleted users
+        Index(
+            "ix_user_active_created_at_id",
+            created_at,
+            id,
+            postgresql_where=deleted_at.is_(None),
+        ),
+    )
+
+
+# Lowercased text matched by user search. The query must use this exact
+# expression for Postgres to pick the trigram index built on it.
+_space = literal_column("' '")
+USER_SEARCH_DOCUMENT = func.lower(
+    User.__table__.c.username + _space
+    + User.__table__.c.first_name + _space
+    + User.__table__.c.last_name + _space
+    + User.__table__.c.email + _space
+    + User.__table__.c.phone_number
+)
+
+# Trigram index over non-deleted users: serves substring (LIKE '%q%') and
+# fuzzy (word similarity) matches of GET /users/search
+Index(
+    "ix_user_search_trgm",
+    USER_SEARCH_DOCUMENT.label("search_document"),
+    postgresql_using="gin",
+    postgresql_ops={"search_document": "gin_trgm_ops"},
+    postgresql_where=User.__table__.c.deleted_at.is_(None),
+)
+
+event.listen(
+    User.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
 
 class Role(Base):
     __tablename__ = "role"
@@ -53,6 +91,8 @@ class Role(Base):
 
 class UserRole(Base):
     __tablename__ = "user_role_link"
+    # Bulk role assignment inserts with ON CONFLICT ON CONSTRAINT user_role_unique DO NOTHING
+    __table_args__ = (UniqueConstraint("user_id", "role_id", name="user_role_unique"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
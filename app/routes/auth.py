@@ -1,41 +1,33 @@
 from jose import jwt
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.crud.user import get_user_status_async
+from app.database import get_async_db
 from app.models.user import User
-from app.services.keycloak_service import (
-    get_token, 
+from app.services.keycloak_async_service import (
+    get_token,
     get_token_standard_flow,
-    get_keycloak_public_key, 
+    get_token_signing_key,
     refresh_access_token,
-    invalidate_token, 
-    check_token_validity,
+    invalidate_token,
     reset_password_keycloak,
 )
+from app.services.token_validation import validate_token_async
+from app.services.revocation import revocation_index
+from app.services.rate_limit import limit_login_attempts
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-# Create the auth endpoint. For test purposes only, this will return a token using client credentials flow.
-# Do not expose this endpoint.
-@router.get("/token/client-credentials")
-async def get_token_client_credentials():
-    try:
-        token = get_token()
-        return token
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
-
-
-# Create the login endpoint
-@router.post("/login")
+# Create the login endpoint. Attempts are throttled per username and IP before reaching Keycloak.
+@router.post("/login", dependencies=[Depends(limit_login_attempts)])
 async def login(
     username: str,
     password: str,
-    session: Session = Depends(get_db)
 ):
     try:
-        token = get_token_standard_flow(
+        token = await get_token_standard_flow(
             username=username,
             password=password
         )
@@ -44,7 +36,7 @@ async def login(
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
         # Decode JWT to get Keycloak ID (subject)
-        public_key = get_keycloak_public_key()
+        public_key = await get_token_signing_key(token["access_token"])
         decoded = jwt.decode(
             token["access_token"], 
             public_key, 
@@ -53,12 +45,12 @@ async def login(
         )
         keycloak_user_id = decoded["sub"]
 
-        # Query DB to validate the user exists and is verified
-        user = session.query(User).filter_by(keycloak_id=keycloak_user_id, deleted_at=None).first()
+        # Validate the user exists and is verified (cached, a replica read only on a miss)
+        exists, deleted, email_verified = await get_user_status_async(keycloak_user_id)
 
-        if not user: 
+        if not exists or deleted:
             raise HTTPException(status_code=403, detail="User does not exist")
-        if not user.email_verified:
+        if not email_verified:
             raise HTTPException(status_code=403, detail="Email not verified")
 
         return token
@@ -71,7 +63,7 @@ async def login(
 @router.post("/token/refresh")
 async def refresh(refresh_token: str):
     try:
-        token = refresh_access_token(refresh_token)
+        token = await refresh_access_token(refresh_token)
         return token
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -81,7 +73,10 @@ async def refresh(refresh_token: str):
 @router.post("/logout")
 async def logout(refresh_token: str):
     try:
-        result = invalidate_token(refresh_token)
+        result = await invalidate_token(refresh_token)
+        # Only sessions Keycloak logged out are revoked, so a forged token can't revoke someone else's
+        if result["msg"] == "Logout successful":
+            await revocation_index.revoke_token(refresh_token)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -89,7 +84,7 @@ async def logout(refresh_token: str):
 
 @router.post("/token/validate")
 async def validate_token(token: str):
-    response = check_token_validity(token)
+    response = await validate_token_async(token)
     try:
         return response
     except ValueError:
@@ -100,18 +95,21 @@ async def validate_token(token: str):
 async def reset_password(
     user_id: str,
     new_password: str,
-    session: Session = Depends(get_db)
+    session: AsyncSession = Depends(get_async_db)
 ):
     try:
-        token = get_token()
+        token = await get_token()
         # Optional: verify user exists and is not deleted
-        user = session.query(User).filter(User.id == user_id, User.deleted_at == None).first()
+        result = await session.execute(
+            select(User).filter(User.id == user_id, User.deleted_at == None)
+        )
+        user = result.scalars().first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         keycloak_user_id = user.keycloak_id
         # Call your existing function to reset the password in Keycloak
-        reset_password_keycloak(token["access_token"], keycloak_user_id, new_password)
+        await reset_password_keycloak(token["access_token"], keycloak_user_id, new_password)
 
         return {"message": "Password reset successful"}
 
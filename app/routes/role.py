@@ -1,13 +1,56 @@
-from typing import List
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.user import Role
-from app.schemas.role import RoleCapabilitiesRead
+from app.crud.role import add_role_users_async, remove_role_users_async
+from app.database import get_async_db, get_read_db
+from app.schemas.role import RoleCapabilitiesRead, RoleUsersRequest, RoleUsersAdded, RoleUsersRemoved
+from app.services.authorization import require_capability
+from app.services.conditional import etag_matches
+from app.services.role_catalog import role_catalog_cache
 
 router = APIRouter(prefix="/roles", tags=["Roles"])
 
 @router.get("/", response_model=List[RoleCapabilitiesRead])
-def get_roles_with_capabilities(session: Session = Depends(get_db)):
-    roles = session.query(Role).all()
-    return roles
+def get_roles_with_capabilities(
+    session: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None),
+):
+    # Served from the in-process catalog cache, the DB is only hit on a miss
+    body, etag = role_catalog_cache.get(session)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Cached capabilities are dropped when the transaction commits (see app/services/authorization.py)
+@router.post("/{role_id}/users", response_model=RoleUsersAdded)
+async def add_users_to_role(
+    role_id: str,
+    request: RoleUsersRequest,
+    session: AsyncSession = Depends(get_async_db),
+    caller: dict = Depends(require_capability("roles:write")),
+):
+    try:
+        return await add_role_users_async(session, role_id, request.user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Unexpected error: " + str(e))
+
+
+@router.delete("/{role_id}/users", response_model=RoleUsersRemoved)
+async def remove_users_from_role(
+    role_id: str,
+    request: RoleUsersRequest,
+    session: AsyncSession = Depends(get_async_db),
+    caller: dict = Depends(require_capability("roles:write")),
+):
+    try:
+        return await remove_role_users_async(session, role_id, request.user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Unexpected error: " + str(e))
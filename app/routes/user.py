@@ -1,49 +1,65 @@
-import requests
-import re
-from fastapi import APIRouter, Depends, HTTPException, Header
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
-from app.database import get_db
-from app.models.user import User
-from app.schemas.user import UserCreate, UserRead, UserUpdate
-from app.crud.user import create_user, get_user, update_user, delete_user
-from app.services.keycloak_service import (
-    get_token, 
-    create_user_keycloak, 
-    enable_disable_user_keycloak, 
+from app.database import get_async_db, get_async_read_db
+from app.schemas.user import (
+    UserCreate,
+    UserRead,
+    UserUpdate,
+    UserBulkCreate,
+    UserBulkResult,
+    UserLookupRequest,
+    UserLookupResult,
+)
+from app.crud.user import (
+    create_user_async,
+    get_user_async,
+    get_users_page_async,
+    get_users_offset_async,
+    get_user_updated_at_async,
+    search_users_async,
+    dump_users_json,
+    USER_READ_COLUMNS,
+    USER_VERSION_COLUMNS,
+    update_user_async,
+    delete_user_async,
+)
+from app.services.keycloak_async_service import (
+    get_token,
+    create_user_keycloak,
+    enable_disable_user_keycloak,
     send_email_verification_link,
 )
-from app.config import KEYCLOAK_SERVER_URL, KEYCLOAK_REALM
+from app.services.user_provisioning import keycloak_user_payload, bulk_create_users
+from app.services.user_export import EXPORT_FORMATS, parse_export_fields, export_users
+from app.services.user_loader import UserLoader
+from app.services.authorization import require_capability
+from app.services.conditional import (
+    PreconditionFailed,
+    etag_matches,
+    http_date,
+    not_modified,
+    rows_etag,
+    updated_at_etag,
+)
 
 router = APIRouter(prefix="/users", tags=["User"])
 
-# Initialize the HTTPBearer scheme for authentication
-bearer_scheme = HTTPBearer()
-
 @router.post("", response_model=UserRead)
 async def create_new_user(
     user_data: UserCreate,
-    session: Session = Depends(get_db),  # Dependency to get the database session
-    header: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_async_db),  # Dependency to get the database session
+    caller: dict = Depends(require_capability("users:write")),
 ):
-    # Use token if you want to validate permissions. 
-    # Token belongs to the user making the request. 
-    # Check if the user has permission to create a new user.
-    # token = header.credentials
     try:
-        keycloak_payload = {
-            "username": user_data.username,
-            "firstName": user_data.first_name,
-            "lastName": user_data.last_name,
-            "email": user_data.email,
-            "enabled": True,
-            "credentials": [{"type": "password", "value": user_data.password, "temporary": False}]
-        }
+        keycloak_payload = keycloak_user_payload(user_data)
         # Now use the token to make the request to Keycloak 
-        token = get_token()["access_token"]
-        keycloak_user_id = create_user_keycloak(
+        token = (await get_token())["access_token"]
+        keycloak_user_id = await create_user_keycloak(
             token, # token using client credentials, client is authorized to manage users
             keycloak_payload
         )
@@ -52,10 +68,10 @@ async def create_new_user(
         user_data["keycloak_id"] = keycloak_user_id
 
         # Proceed to create user in PostgreSQL after Keycloak
-        created_user = create_user(session, **user_data)
+        created_user = await create_user_async(session, **user_data)
         
         # Send email verification link
-        send_email_verification_link(token, keycloak_user_id)
+        await send_email_verification_link(token, keycloak_user_id)
 
         return created_user
     
@@ -63,18 +79,125 @@ async def create_new_user(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/bulk", response_model=list[UserBulkResult])
+async def create_users_bulk(
+    bulk_data: UserBulkCreate,
+    session: AsyncSession = Depends(get_async_db),
+    caller: dict = Depends(require_capability("users:write")),
+    use_partial_import: bool = False,
+):
+    # Per-record failures are reported in the results, not as an HTTP error
+    try:
+        return await bulk_create_users(
+            session,
+            bulk_data.users,
+            use_partial_import=use_partial_import,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/export")
+async def export_all_users(
+    caller: dict = Depends(require_capability("users:read")),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields, defaults to all"),
+    deleted: Optional[bool] = Query(None, description="true: only deleted, false: only active, unset: all"),
+    email_verified: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    try:
+        columns = parse_export_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        export_users(
+            format,
+            columns,
+            deleted=deleted,
+            email_verified=email_verified,
+            created_from=created_from,
+            created_to=created_to,
+        ),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=users.{format}"},
+    )
+
+
+@router.post("/lookup", response_model=UserLookupResult)
+async def lookup_users(
+    lookup: UserLookupRequest,
+    session: AsyncSession = Depends(get_async_read_db),
+    caller: dict = Depends(require_capability("users:read")),
+):
+    try:
+        key = "ids" if lookup.ids else "keycloak_ids"
+        requested = list(dict.fromkeys(getattr(lookup, key)))
+        column = "id" if key == "ids" else "keycloak_id"
+
+        # One query for the whole batch, soft-deleted users count as missing
+        rows = await UserLoader(session, key=column).load_many(requested)
+        result = UserLookupResult(
+            users={str(user_id): row._asdict() for user_id, row in zip(requested, rows) if row is not None},
+            missing=[user_id for user_id, row in zip(requested, rows) if row is None],
+        )
+        return Response(content=result.model_dump_json(), media_type="application/json")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Unexpected error: " + str(e))
+
+
+# Registered before /{user_id} so "search" isn't taken for a user id
+@router.get("/search", response_model=list[UserRead])
+async def search_users(
+    q: str = Query(..., min_length=2, max_length=255, description="Part of a username, name, email or phone number"),
+    session: AsyncSession = Depends(get_async_read_db),
+    caller: dict = Depends(require_capability("users:read")),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    try:
+        users, next_cursor = await search_users_async(session, q, limit=limit, cursor=cursor)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        # Best match first; pass X-Next-Cursor back as ?cursor= for the next page
+        return Response(content=dump_users_json(users), media_type="application/json", headers=headers)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Unexpected error: " + str(e))
+
+
+def _version_headers(updated_at: datetime) -> dict:
+    return {"ETag": updated_at_etag(updated_at), "Last-Modified": http_date(updated_at), "Cache-Control": "no-cache"}
+
+
 @router.get("/{user_id}", response_model=UserRead)
 async def get_user_by_id(
     user_id: str,
-    session: Session = Depends(get_db),
-    header: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_async_read_db),
+    caller: dict = Depends(require_capability("users:read")),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
 ):
-    token = header.credentials  # Validate permissions if needed
-
     try:
-        user = get_user(session, user_id)
-        if user:
-            return UserRead.model_validate(user)
+        # Conditional requests are answered from updated_at alone when nothing changed
+        if if_none_match or if_modified_since:
+            updated_at = await get_user_updated_at_async(session, user_id)
+            headers = _version_headers(updated_at)
+            if not_modified(if_none_match, if_modified_since, headers["ETag"], updated_at):
+                return Response(status_code=304, headers=headers)
+
+        user = await get_user_async(session, user_id)
+        return Response(
+            content=UserRead.model_validate(user).model_dump_json(),
+            media_type="application/json",
+            headers=_version_headers(user.updated_at),
+        )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -83,18 +206,37 @@ async def get_user_by_id(
 
 @router.get("", response_model=list[UserRead])
 async def get_all_users(
-    session: Session = Depends(get_db),
-    header: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    page: int = 1,
-    page_size: int = 10,
+    session: AsyncSession = Depends(get_async_read_db),
+    caller: dict = Depends(require_capability("users:read")),
+    cursor: Optional[str] = None,
+    page: Optional[int] = Query(None, ge=1, description="Legacy offset pagination, prefer cursor"),
+    page_size: int = Query(10, ge=1, le=1000),
+    if_none_match: Optional[str] = Header(None),
 ):
+    async def load_page(columns):
+        if page is not None:
+            return await get_users_offset_async(session, page=page, page_size=page_size, columns=columns), None
+        return await get_users_page_async(session, page_size=page_size, cursor=cursor, columns=columns)
+
     try:
-        query = session.query(User).filter(User.deleted_at == None)
-        users = query.offset((page - 1) * page_size).limit(page_size).all()
+        # The page ETag covers its ids and updated_at; check it before loading full rows
+        if if_none_match:
+            versions, next_cursor = await load_page(USER_VERSION_COLUMNS)
+            etag = rows_etag(versions, next_cursor)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+        users, next_cursor = await load_page(USER_READ_COLUMNS)
+        headers = {"ETag": rows_etag(users, next_cursor), "Cache-Control": "no-cache"}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
 
+        # Serialized here in one pass, so FastAPI doesn't validate and encode the page again.
         # Return empty list if no users found, no 404
-        return [UserRead.model_validate(user) for user in users]
+        return Response(content=dump_users_json(users), media_type="application/json", headers=headers)
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Unexpected error: " + str(e))
 
@@ -103,21 +245,25 @@ async def get_all_users(
 async def update_user_by_id(
     user_id: str,
     user_data: UserUpdate,
-    session: Session = Depends(get_db),
-    header: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    response: Response,
+    session: AsyncSession = Depends(get_async_db),
+    caller: dict = Depends(require_capability("users:write")),
+    if_match: Optional[str] = Header(None, description="ETag of the version being updated (optimistic concurrency)"),
 ):
-    token = header.credentials  # Validate permissions if needed
-
     try:
-        updated_user = update_user(
+        updated_user = await update_user_async(
             session=session,
             user_id=user_id,
             first_name=user_data.first_name,
             last_name=user_data.last_name,
             phone_number=user_data.phone_number,
             email_verified=user_data.email_verified,
+            if_match=if_match,
         )
+        response.headers.update(_version_headers(updated_user.updated_at))
         return updated_user
+    except PreconditionFailed as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except IntegrityError as e:
@@ -129,25 +275,23 @@ async def update_user_by_id(
 @router.delete("/{user_id}")
 async def delete_user_by_id(
     user_id: str,
-    session: Session = Depends(get_db),
-    header: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_async_db),
+    caller: dict = Depends(require_capability("users:write")),
 ):
-    token = header.credentials  # Validate permissions if needed
-
     try:
-        user = get_user(session, user_id)
+        user = await get_user_async(session, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Disable user in Keycloak first
-        enable_disable_user_keycloak(
-            get_token()["access_token"],
+        await enable_disable_user_keycloak(
+            (await get_token())["access_token"],
             user.keycloak_id,
             enable=False
         )
 
         # Now soft delete in users database
-        return delete_user(session, user_id)
+        return await delete_user_async(session, user_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
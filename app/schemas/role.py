@@ -1,9 +1,11 @@
 # schemas/role.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from typing import List
 
+from app.config import ROLE_USERS_MAX_IDS
+
 class CapabilityRead(BaseModel):
     id: UUID
     name: str
@@ -19,4 +21,21 @@ class RoleCapabilitiesRead(BaseModel):
     capabilities: List[CapabilityRead]
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# Users to add to or remove from a role
+class RoleUsersRequest(BaseModel):
+    user_ids: List[UUID] = Field(..., min_length=1, max_length=ROLE_USERS_MAX_IDS)
+
+# Counts of a bulk role assignment: skipped users already had the role,
+# missing ids have no (non-deleted) user
+class RoleUsersAdded(BaseModel):
+    added: int
+    skipped: int
+    missing: int
+
+# Counts of a bulk role removal: skipped users didn't have the role
+class RoleUsersRemoved(BaseModel):
+    removed: int
+    skipped: int
+    missing: int
@@ -1,7 +1,9 @@
 import uuid
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+from app.config import USERS_BULK_MAX_BATCH, USERS_LOOKUP_MAX_IDS
 
 # Base User Schema
 class UserBase(BaseModel):
@@ -33,3 +35,31 @@ class UserUpdate(BaseModel):
     last_name: Optional[str] = None
     phone_number: Optional[str] = None
     email_verified: Optional[bool] = None
+
+# Schema for bulk user creation
+class UserBulkCreate(BaseModel):
+    users: List[UserCreate] = Field(..., min_length=1, max_length=USERS_BULK_MAX_BATCH)
+
+# Per-record result of a bulk user creation
+class UserBulkResult(BaseModel):
+    index: int
+    username: str
+    success: bool
+    user: Optional[UserRead] = None
+    error: Optional[str] = None
+
+# Batch lookup by ids or by keycloak_ids (one of the two)
+class UserLookupRequest(BaseModel):
+    ids: List[uuid.UUID] = Field(default_factory=list, max_length=USERS_LOOKUP_MAX_IDS)
+    keycloak_ids: List[uuid.UUID] = Field(default_factory=list, max_length=USERS_LOOKUP_MAX_IDS)
+
+    @model_validator(mode="after")
+    def one_kind_of_id(self):
+        if bool(self.ids) == bool(self.keycloak_ids):
+            raise ValueError("Provide either 'ids' or 'keycloak_ids'")
+        return self
+
+# Found users keyed by the requested id, and the ids with no (non-deleted) user
+class UserLookupResult(BaseModel):
+    users: Dict[str, UserRead]
+    missing: List[uuid.UUID]
@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import uuid
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import AUTHZ_SERVICE_ACCOUNT_CLIENTS, PERMISSION_CACHE_TTL, PERMISSION_CACHE_SIZE
+from app.database import get_async_db
+from app.models.user import User, Role, UserRole, Capability, RoleCapability
+from app.services.cache import TTLCache, cache_backend
+from app.services.token_validation import validate_token_async
+
+PERMISSION_MODELS = (Role, UserRole, Capability, RoleCapability)
+PERMISSION_TABLES = {model.__table__ for model in PERMISSION_MODELS}
+
+bearer_scheme = HTTPBearer()
+
+
+class CapabilityIndex:
+    """
+    Interns capability names to bit positions so a capability set is one int.
+    """
+
+    def __init__(self):
+        self._bits = {}
+        self._lock = threading.Lock()
+
+    def bit(self, name: str) -> int:
+        bit = self._bits.get(name)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(name, len(self._bits))
+        return bit
+
+    def mask(self, names) -> int:
+        mask = 0
+        for name in names:
+            mask |= 1 << self.bit(name)
+        return mask
+
+
+capability_index = CapabilityIndex()
+
+class PermissionCache:
+    """
+    Per-worker cache of capability bitsets by keycloak_id.
+
+    Invalidations apply to this worker at once and are published on the
+    cache backend, so on a shared backend every worker drops the entry.
+    A bitset loaded while an invalidation happened is not cached.
+    """
+
+    CHANNEL = "permissions-invalidate"
+    ALL = "*"
+
+    def __init__(self, backend, maxsize: int = 100000, ttl: float = 300):
+        self.backend = backend
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.version = 0
+        self._pending = set()
+        backend.on(self.CHANNEL, self._on_message)
+
+    def get(self, keycloak_id):
+        return self.local.get(str(keycloak_id))
+
+    def set(self, keycloak_id, mask: int, version: int):
+        # Skip masks loaded before an invalidation that arrived meanwhile
+        if version == self.version:
+            self.local.set(str(keycloak_id), mask)
+
+    def _on_message(self, message: str):
+        self.version += 1
+        if message == self.ALL:
+            self.local.clear()
+        else:
+            self.local.delete(message)
+
+    def invalidate(self, keycloak_id=None):
+        message = self.ALL if keycloak_id is None else str(keycloak_id)
+        self._on_message(message)
+        if not self.backend.shared:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a worker thread (sync sessions): publish from the app's event loop
+            if self.backend.loop is not None:
+                asyncio.run_coroutine_threadsafe(self.backend.publish(self.CHANNEL, message), self.backend.loop)
+            return
+        task = loop.create_task(self.backend.publish(self.CHANNEL, message))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+
+permission_cache = PermissionCache(cache_backend, maxsize=PERMISSION_CACHE_SIZE, ttl=PERMISSION_CACHE_TTL)
+
+
+async def load_capability_mask(session: AsyncSession, keycloak_id: str) -> int:
+    """
+    Resolve the effective capabilities of a user in one query.
+    """
+    result = await session.execute(
+        select(Capability.name)
+        .join(RoleCapability, RoleCapability.capability_id == Capability.id)
+        .join(Role, Role.id == RoleCapability.role_id)
+        .join(UserRole, UserRole.role_id == Role.id)
+        .join(User, User.id == UserRole.user_id)
+        .filter(
+            User.keycloak_id == uuid.UUID(str(keycloak_id)),
+            User.deleted_at == None,
+            Role.deleted_at == None,
+        )
+        .distinct()
+    )
+    return capability_index.mask(result.scalars().all())
+
+
+async def get_capability_mask(session: AsyncSession, keycloak_id: str) -> int:
+    mask = permission_cache.get(keycloak_id)
+    if mask is None:
+        version = permission_cache.version
+        mask = await load_capability_mask(session, keycloak_id)
+        permission_cache.set(keycloak_id, mask, version)
+    return mask
+
+
+def invalidate_permissions(keycloak_id: str = None):
+    """
+    Drop cached capabilities of one user, or of everyone, in every worker.
+    """
+    permission_cache.invalidate(keycloak_id)
+
+
+def is_trusted_service_account(claims: dict) -> bool:
+    """
+    Whether the token is a client credentials token of a client in
+    `AUTHZ_SERVICE_ACCOUNT_CLIENTS`. Keycloak names a client's service
+    account user "service-account-<client id>" and reserves the prefix.
+    """
+    client_id = claims.get("azp")
+    return (
+        client_id in AUTHZ_SERVICE_ACCOUNT_CLIENTS
+        and (claims.get("preferred_username") or "").lower() == f"service-account-{client_id}".lower()
+    )
+
+
+def require_capability(*capabilities: str):
+    """
+    FastAPI dependency that authenticates the bearer token and requires the
+    caller to hold every capability in `capabilities`. Returns the token claims.
+    """
+    required = capability_index.mask(capabilities)
+
+    async def dependency(
+        header: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+        session: AsyncSession = Depends(get_async_db),
+    ) -> dict:
+        claims = await validate_token_async(header.credentials)
+        if not claims.get("active") or not claims.get("sub"):
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+        # The service's own client has no user row; it holds every capability
+        if is_trusted_service_account(claims):
+            return claims
+
+        mask = await get_capability_mask(session, claims["sub"])
+        if mask & required != required:
+            raise HTTPException(status_code=403, detail="Missing capability: " + ", ".join(capabilities))
+
+        return claims
+
+    return dependency
+
+
+# Invalidate cached capabilities when roles, capabilities or their links change
+@event.listens_for(Session, "after_flush")
+def _mark_permission_changes(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, PERMISSION_MODELS):
+            session.info["permissions_dirty"] = True
+        elif isinstance(instance, User) and instance.keycloak_id is not None:
+            session.info.setdefault("permission_users", set()).add(str(instance.keycloak_id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_permission_statements(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None and table in PERMISSION_TABLES:
+        orm_execute_state.session.info["permissions_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_permissions_after_commit(session):
+    if session.info.pop("permissions_dirty", False):
+        invalidate_permissions()
+    for keycloak_id in session.info.pop("permission_users", ()):
+        invalidate_permissions(keycloak_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_permissions_after_rollback(session, previous_transaction):
+    session.info.pop("permissions_dirty", None)
+    session.info.pop("permission_users", None)
@@ -0,0 +1,442 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from pydantic_core import from_json, to_json
+
+from app.config import CACHE_BACKEND_URL, CACHE_MAX_ENTRIES, CACHE_LOCAL_TTL, CACHE_LOCK_TIMEOUT
+
+# Stored in place of a value to remember that it does not exist (negative caching)
+NEGATIVE = "__negative__"
+INVALIDATION_CHANNEL = "cache-invalidate"
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with a per-entry time to live.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, ttl: float = None) -> bool:
+        """
+        Set `key` only if it has no live entry. Returns True if it was set.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return False
+        self.set(key, value, ttl)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InProcessCacheBackend:
+    """
+    Cache backend private to this worker: a `TTLCache` plus in-process
+    delivery of published messages. Values are stored as is.
+    """
+
+    shared = False
+
+    def __init__(self, maxsize: int = 100000):
+        self._cache = TTLCache(maxsize=maxsize)
+        self._handlers = {}
+
+    def on(self, channel: str, handler):
+        """
+        Call `handler(message)` for every message published on `channel`.
+        """
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def get(self, key):
+        return self._cache.get(key)
+
+    async def set(self, key, value, ttl: float):
+        self._cache.set(key, value, ttl)
+
+    async def add(self, key, value, ttl: float) -> bool:
+        return self._cache.add(key, value, ttl)
+
+    async def renew(self, key, value, ttl: float) -> bool:
+        """
+        Reset the TTL of `key` if it still holds `value`.
+        """
+        if self._cache.get(key) != value:
+            return False
+        self._cache.set(key, value, ttl)
+        return True
+
+    async def delete(self, key):
+        self._cache.delete(key)
+
+    def discard(self, key):
+        self._cache.delete(key)
+
+    async def publish(self, channel: str, message: str):
+        for handler in self._handlers.get(channel, ()):
+            handler(message)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        self._cache.clear()
+
+
+class RedisCacheBackend:
+    """
+    Cache backend shared by every worker through Redis. Values are JSON
+    encoded; published messages reach the handlers of every worker.
+
+    `client` is a `redis.asyncio.Redis` or any object with the same
+    get/set/delete/publish/pubsub subset, such as `InMemoryRedis`.
+    """
+
+    shared = True
+
+    # Compare-and-set of the TTL, atomic on the server
+    RENEW_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    )
+
+    def __init__(self, client, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+        self._handlers = {}
+        self._listener = None
+        self.loop = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise Exception("The redis package is required for a Redis cache backend")
+        return cls(redis.from_url(url), **kwargs)
+
+    def on(self, channel: str, handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else from_json(raw)
+
+    async def set(self, key, value, ttl: float):
+        if ttl > 0:
+            await self.client.set(self.prefix + key, to_json(value), px=int(ttl * 1000))
+
+    async def add(self, key, value, ttl: float) -> bool:
+        return bool(await self.client.set(self.prefix + key, to_json(value), px=int(ttl * 1000), nx=True))
+
+    async def renew(self, key, value, ttl: float) -> bool:
+        """
+        Reset the TTL of `key` if it still holds `value`, in one atomic step.
+        """
+        return bool(await self.client.eval(self.RENEW_SCRIPT, 1, self.prefix + key, to_json(value), int(ttl * 1000)))
+
+    async def delete(self, key):
+        await self.client.delete(self.prefix + key)
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(self.prefix + channel, message)
+
+    async def start(self):
+        """
+        Start delivering published messages to the registered handlers.
+        """
+        self.loop = asyncio.get_running_loop()
+        if self._listener is None and self._handlers:
+            pubsub = self.client.pubsub()
+            await pubsub.subscribe(*[self.prefix + channel for channel in self._handlers])
+            self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            channel = message["channel"]
+            data = message["data"]
+            channel = (channel.decode() if isinstance(channel, bytes) else channel)[len(self.prefix):]
+            data = data.decode() if isinstance(data, bytes) else data
+            for handler in self._handlers.get(channel, ()):
+                handler(data)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.client.aclose()
+
+
+class InMemoryRedis:
+    """
+    Local stand-in for the subset of the `redis.asyncio` client used by
+    `RedisCacheBackend`. Backends built on one instance behave like workers
+    sharing one Redis, which lets tests run without a server.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._subscribers = {}
+
+    def _live(self, name):
+        entry = self._data.get(name)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[name]
+            return None
+        return entry
+
+    async def get(self, name):
+        entry = self._live(name)
+        return None if entry is None else entry[0]
+
+    async def set(self, name, value, px: int = None, nx: bool = False):
+        if nx and self._live(name) is not None:
+            return None
+        expires_at = None if px is None else time.monotonic() + px / 1000
+        self._data[name] = (value if isinstance(value, bytes) else str(value).encode(), expires_at)
+        return True
+
+    async def delete(self, *names):
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    async def eval(self, script, numkeys, *args):
+        # Only the script used by `RedisCacheBackend.renew`
+        if script != RedisCacheBackend.RENEW_SCRIPT:
+            raise NotImplementedError("InMemoryRedis only runs RedisCacheBackend.RENEW_SCRIPT")
+        name, value, px = args
+        entry = self._live(name)
+        value = value if isinstance(value, bytes) else str(value).encode()
+        if entry is None or entry[0] != value:
+            return 0
+        self._data[name] = (entry[0], time.monotonic() + int(px) / 1000)
+        return 1
+
+    async def publish(self, channel, message):
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({"type": "message", "channel": channel.encode(), "data": str(message).encode()})
+        return len(queues)
+
+    def pubsub(self):
+        return InMemoryPubSub(self)
+
+    async def aclose(self):
+        pass
+
+
+class InMemoryPubSub:
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        for channel in channels:
+            self._client._subscribers.setdefault(channel, []).append(self._queue)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+
+class Cache:
+    """
+    A namespace of cache entries on a backend.
+
+    `get_or_compute` runs `compute` once per key: concurrent callers in this
+    worker share one in-flight call and, on a shared backend, other workers
+    wait up to `lock_timeout` for the first one to store its result. A
+    `None` result is cached as a negative entry for `negative_ttl` seconds.
+
+    On a shared backend, entries are also kept in a per-worker near cache
+    for `local_ttl` seconds; `delete`/`invalidate` publish the key so every
+    worker drops its near copy.
+    """
+
+    def __init__(
+        self,
+        backend,
+        namespace: str,
+        ttl: float = 300,
+        negative_ttl: float = 0,
+        local_maxsize: int = 10000,
+        local_ttl: float = CACHE_LOCAL_TTL,
+        lock_timeout: float = CACHE_LOCK_TIMEOUT,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock_timeout = lock_timeout
+        self.local = None
+        if backend.shared and local_maxsize and local_ttl > 0:
+            self.local = TTLCache(maxsize=local_maxsize, ttl=min(local_ttl, ttl))
+            backend.on(INVALIDATION_CHANNEL, self._drop_local)
+        self._inflight = {}
+        self._pending = set()
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _drop_local(self, full_key: str):
+        if full_key.startswith(self.namespace + ":"):
+            self.local.delete(full_key)
+
+    async def _lookup(self, full_key: str):
+        if self.local is not None:
+            value = self.local.get(full_key, _MISSING)
+            if value is not _MISSING:
+                return value
+        value = await self.backend.get(full_key)
+        if value is None:
+            return _MISSING
+        if self.local is not None:
+            self.local.set(full_key, value)
+        return value
+
+    async def get(self, key, default=None):
+        value = await self._lookup(self._key(key))
+        return default if value is _MISSING or value == NEGATIVE else value
+
+    async def set(self, key, value, ttl: float = None):
+        """
+        Store `value`, or a negative entry if it is None.
+        """
+        full_key = self._key(key)
+        if value is None:
+            value, ttl = NEGATIVE, self.negative_ttl
+        elif ttl is None:
+            ttl = self.ttl
+        if ttl <= 0:
+            return
+        await self.backend.set(full_key, value, ttl)
+        if self.local is not None:
+            self.local.set(full_key, value, min(ttl, self.local.ttl))
+
+    async def delete(self, key):
+        full_key = self._key(key)
+        if self.local is not None:
+            self.local.delete(full_key)
+        await self.backend.delete(full_key)
+        if self.backend.shared:
+            await self.backend.publish(INVALIDATION_CHANNEL, full_key)
+
+    def invalidate(self, key):
+        """
+        `delete` for sync callers: this worker's copy goes immediately, the
+        backend entry and the other workers' copies right after.
+        """
+        if not self.backend.shared:
+            self.backend.discard(self._key(key))
+            return
+
+        if self.local is not None:
+            self.local.delete(self._key(key))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a worker thread: hand the delete to the app's event loop
+            if self.backend.loop is not None:
+                asyncio.run_coroutine_threadsafe(self.delete(key), self.backend.loop)
+            return
+        task = loop.create_task(self.delete(key))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def get_or_compute(self, key, compute, ttl=None):
+        """
+        Return the cached value of `key`, or await `compute()` once and cache
+        its result. `ttl` may be a function of the computed value.
+        """
+        full_key = self._key(key)
+        value = await self._lookup(full_key)
+        if value is not _MISSING:
+            return None if value == NEGATIVE else value
+
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._compute(full_key, key, compute, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[full_key]
+
+    async def _compute(self, full_key: str, key, compute, ttl):
+        locked = False
+        if self.backend.shared and self.lock_timeout > 0:
+            # Let one worker compute; the others poll for its result
+            locked = await self.backend.add(full_key + ":lock", 1, self.lock_timeout)
+            if not locked:
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    value = await self._lookup(full_key)
+                    if value is not _MISSING:
+                        return None if value == NEGATIVE else value
+
+        try:
+            value = await compute()
+            await self.set(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            if locked:
+                await self.backend.delete(full_key + ":lock")
+
+
+def create_cache_backend(url: str = None):
+    if url:
+        return RedisCacheBackend.from_url(url)
+    return InProcessCacheBackend(maxsize=CACHE_MAX_ENTRIES)
+
+
+# Process-wide backend shared by every Cache namespace
+cache_backend = create_cache_backend(CACHE_BACKEND_URL)
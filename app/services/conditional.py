@@ -0,0 +1,82 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+
+class PreconditionFailed(Exception):
+    """
+    Raised when an If-Match precondition does not hold.
+    """
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    True if an If-None-Match header value matches `etag` (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    etag = etag[2:] if etag.startswith("W/") else etag
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+def etag_matches_strong(if_match: str, etag: str) -> bool:
+    """
+    True if an If-Match header value matches `etag` (strong comparison, RFC 9110
+    section 13.1.1): weak ETags on either side never match.
+    """
+    if not if_match:
+        return False
+    if if_match.strip() == "*":
+        return True
+    if etag.startswith("W/"):
+        return False
+    return etag in [tag.strip() for tag in if_match.split(",")]
+
+
+def _utc(value: datetime) -> datetime:
+    # Timestamps are stored naive, in the database server's time zone (UTC)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def updated_at_etag(updated_at: datetime) -> str:
+    """
+    Strong ETag of a resource versioned by its `updated_at`: every change sets
+    a new `updated_at`, so equal tags mean an identical representation.
+    """
+    return f'"{int(_utc(updated_at).timestamp() * 1_000_000):x}"'
+
+
+def rows_etag(rows, *extra) -> str:
+    """
+    Weak ETag of a list of rows with `id` and `updated_at`: changes when a row
+    is added, removed or updated.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(f"{row.id}:{row.updated_at.isoformat()};".encode())
+    for value in extra:
+        digest.update(f"{value};".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def not_modified(if_none_match: str, if_modified_since: str, etag: str, last_modified: datetime = None) -> bool:
+    """
+    Evaluate GET preconditions: If-None-Match wins; If-Modified-Since is
+    only used without it, at the one second resolution of HTTP dates.
+    """
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _utc(last_modified).replace(microsecond=0) <= _utc(since)
+    return False
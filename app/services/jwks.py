@@ -0,0 +1,112 @@
+import asyncio
+import time
+from jose import jwk
+
+from app.config import KEYCLOAK_JWKS_TTL, KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL
+
+SUPPORTED_ALGORITHMS = ("RS256", "RS384", "RS512")
+
+
+class JWKSKeyStore:
+    """
+    In-process cache of the realm signing keys, indexed by `kid`.
+
+    Keys are parsed once when the JWKS document is loaded so token
+    verification never has to touch the network on the hot path. The
+    document is refetched when it is older than `ttl` or when a token
+    carries a `kid` we have not seen (key rotation), but never more often
+    than once per `min_refetch_interval` seconds.
+    """
+
+    def __init__(self, ttl: int = 3600, min_refetch_interval: int = 30):
+        self._ttl = ttl
+        self._min_refetch_interval = min_refetch_interval
+        self._keys = {}
+        self._default_kid = None
+        self._loaded_at = None
+        self._last_fetch_at = None
+        self._async_lock = None
+
+    def load(self, jwks: dict):
+        """
+        Replace the cached keys with the signing keys of a JWKS document.
+        """
+        keys = {}
+        default_kid = None
+        for key in jwks.get("keys", []):
+            if key.get("use", "sig") != "sig":
+                continue
+            alg = key.get("alg", "RS256")
+            if alg not in SUPPORTED_ALGORITHMS:
+                continue
+            kid = key.get("kid")
+            keys[kid] = jwk.construct(key, alg)
+            if default_kid is None and alg == "RS256":
+                default_kid = kid
+
+        self._keys = keys
+        self._default_kid = default_kid
+        self._loaded_at = time.monotonic()
+
+    def lookup(self, kid: str = None):
+        """
+        Return the cached key for `kid` (or the default RS256 key) without any I/O.
+        """
+        keys = self._keys
+        if kid is None:
+            return keys.get(self._default_kid)
+        return keys.get(kid)
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self._ttl
+
+    def can_refetch(self) -> bool:
+        return (
+            self._last_fetch_at is None
+            or time.monotonic() - self._last_fetch_at >= self._min_refetch_interval
+        )
+
+    def mark_fetch(self):
+        self._last_fetch_at = time.monotonic()
+
+    async def get_key_async(self, kid: str = None, fetch_jwks=None):
+        """
+        Return the verification key for `kid`, refetching the JWKS document with
+        the coroutine function `fetch_jwks` if needed. Concurrent refetches are
+        single-flight; if Keycloak is unreachable the previous keys are kept.
+        """
+        key = self.lookup(kid)
+        if key is not None and not self.is_stale():
+            return key
+
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+
+        async with self._async_lock:
+            key = self.lookup(kid)
+            if (key is None or self.is_stale()) and self.can_refetch():
+                self.mark_fetch()
+                try:
+                    self.load(await fetch_jwks())
+                except Exception:
+                    # Keep serving the previous keys if Keycloak is unreachable
+                    if key is None:
+                        raise
+                key = self.lookup(kid)
+
+        if key is None:
+            raise Exception(f"No valid signing key found for kid '{kid}'.")
+        return key
+
+    def clear(self):
+        self._keys = {}
+        self._default_kid = None
+        self._loaded_at = None
+        self._last_fetch_at = None
+
+
+# Process-wide signing key cache of this worker
+jwks_store = JWKSKeyStore(
+    ttl=KEYCLOAK_JWKS_TTL,
+    min_refetch_interval=KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL,
+)
@@ -0,0 +1,388 @@
+import time
+from jose import jwt
+
+from app.config import (
+    KEYCLOAK_SERVER_URL,
+    KEYCLOAK_REALM,
+    KEYCLOAK_CLIENT_ID,
+    KEYCLOAK_CLIENT_SECRET,
+    KEYCLOAK_ADMIN_TOKEN_REFRESH_MARGIN,
+    KEYCLOAK_JWKS_TTL,
+    KEYCLOAK_HTTP_POOL_SIZE,
+    KEYCLOAK_HTTP_CONNECT_TIMEOUT,
+    KEYCLOAK_HTTP_READ_TIMEOUT,
+    KEYCLOAK_HTTP_RETRIES,
+    KEYCLOAK_HTTP_BACKOFF_FACTOR,
+)
+from app.services.cache import Cache, cache_backend
+from app.services.keycloak_client import AsyncKeycloakClient
+from app.services.jwks import jwks_store
+from app.services.token_manager import AsyncServiceAccountTokenManager
+
+keycloak_client = AsyncKeycloakClient(
+    KEYCLOAK_SERVER_URL,
+    KEYCLOAK_REALM,
+    pool_size=KEYCLOAK_HTTP_POOL_SIZE,
+    connect_timeout=KEYCLOAK_HTTP_CONNECT_TIMEOUT,
+    read_timeout=KEYCLOAK_HTTP_READ_TIMEOUT,
+    retries=KEYCLOAK_HTTP_RETRIES,
+    backoff_factor=KEYCLOAK_HTTP_BACKOFF_FACTOR,
+)
+
+
+async def request_service_account_token():
+    """
+    Run a client_credentials grant against Keycloak.
+    """
+    payload = {
+        "grant_type": "client_credentials",
+        "client_id": KEYCLOAK_CLIENT_ID,
+        "client_secret": KEYCLOAK_CLIENT_SECRET
+    }
+
+    response = await keycloak_client.post_form("token", payload, operation="token.client_credentials")
+    return response.json()
+
+
+# Service account token and JWKS document, shared by every worker on a shared cache backend
+keycloak_cache = Cache(cache_backend, "keycloak", ttl=KEYCLOAK_JWKS_TTL, local_maxsize=0)
+
+token_manager = AsyncServiceAccountTokenManager(
+    request_service_account_token,
+    refresh_margin=KEYCLOAK_ADMIN_TOKEN_REFRESH_MARGIN,
+    cache=keycloak_cache,
+)
+
+
+async def get_token():
+    """
+    Return the cached service account token, refreshing it when due.
+    """
+    return await token_manager.get_token()
+
+
+async def _admin_request(method: str, url: str, token: str = None, operation: str = "admin", **kwargs):
+    """
+    Call the Keycloak admin API with the service account token.
+    A 401 invalidates the cached token and, if the token came from the
+    token manager, the call is retried once with a fresh one.
+    """
+    access_token = token or await token_manager.get_access_token()
+    retry = token is None or token_manager.issued(access_token)
+
+    headers = keycloak_client.bearer_headers(access_token)
+    response = await keycloak_client.request(method, url, operation=operation, headers=headers, **kwargs)
+
+    if response.status_code == 401:
+        await token_manager.invalidate_async(access_token)
+        if retry:
+            headers = keycloak_client.bearer_headers(await token_manager.get_access_token())
+            response = await keycloak_client.request(method, url, operation=operation, headers=headers, **kwargs)
+
+    return response
+
+
+async def get_token_standard_flow(
+    username: str,
+    password: str
+):
+    payload = {
+        "client_id": KEYCLOAK_CLIENT_ID,
+        "client_secret": KEYCLOAK_CLIENT_SECRET,
+        "username": username,
+        "password": password,
+        "grant_type": "password"
+    }
+
+    response = await keycloak_client.post_form("token", payload, operation="token.password")
+    return response.json()
+
+
+async def fetch_keycloak_jwks():
+    """
+    Fetch the realm JWKS document from Keycloak.
+    """
+    response = await keycloak_client.request("GET", keycloak_client.oidc_url("certs"), operation="certs")
+    response.raise_for_status()
+    return response.json()
+
+
+# Fetch time of the newest JWKS document this worker has loaded
+_jwks_loaded = {"fetched_at": 0.0}
+
+
+async def fetch_shared_jwks():
+    """
+    Fetch the JWKS document through the shared cache. A cached document is only
+    used if it is newer than the one already loaded here, so a refetch for an
+    unknown `kid` (key rotation) still reaches Keycloak.
+    """
+    entry = await keycloak_cache.get("jwks")
+    if entry is not None and entry["fetched_at"] > _jwks_loaded["fetched_at"]:
+        _jwks_loaded["fetched_at"] = entry["fetched_at"]
+        return entry["jwks"]
+
+    jwks = await fetch_keycloak_jwks()
+    fetched_at = time.time()
+    await keycloak_cache.set("jwks", {"jwks": jwks, "fetched_at": fetched_at})
+    _jwks_loaded["fetched_at"] = fetched_at
+    return jwks
+
+
+async def get_keycloak_public_key(kid: str = None):
+    """
+    Retrieve the public key for JWT verification from the shared JWKS cache.
+    """
+    return await jwks_store.get_key_async(kid, fetch_shared_jwks)
+
+
+async def get_token_signing_key(token: str):
+    """
+    Retrieve the public key matching the `kid` in the token header.
+    """
+    return await get_keycloak_public_key(jwt.get_unverified_header(token).get("kid"))
+
+
+async def refresh_access_token(
+    refresh_token: str
+):
+    """
+    Refresh an access token using a refresh token.
+    """
+    payload = {
+        "client_id": KEYCLOAK_CLIENT_ID,
+        "client_secret": KEYCLOAK_CLIENT_SECRET,
+        "refresh_token": refresh_token,
+        "grant_type": "refresh_token"
+    }
+
+    response = await keycloak_client.post_form("token", payload, operation="token.refresh")
+    return response.json()
+
+
+async def invalidate_token(
+    refresh_token: str
+):
+    """
+    Invalidate a refresh token in Keycloak.
+    """
+    data = {
+        "client_id": KEYCLOAK_CLIENT_ID,
+        "client_secret": KEYCLOAK_CLIENT_SECRET,
+        "refresh_token": refresh_token
+    }
+
+    response = await keycloak_client.post_form("logout", data)
+    if response.status_code in [200, 204]:
+        return {"msg": "Logout successful"}
+    else:
+        return {"msg": "Invalid refresh token"}
+
+
+async def check_token_validity(token: str):
+    """
+    Introspect a token using Keycloak to check if it's active.
+    """
+    data = {
+        "token": token,
+        "client_id": KEYCLOAK_CLIENT_ID,
+        "client_secret": KEYCLOAK_CLIENT_SECRET
+    }
+
+    response = await keycloak_client.post_form("token/introspect", data, operation="introspect")
+
+    return response.json()
+
+
+async def create_user_keycloak(
+    token: str,
+    user_data: dict
+):
+    """
+    Create a new user in Keycloak.
+    """
+    keycloak_user_id, _ = await create_or_enable_user_keycloak(token, user_data)
+    return keycloak_user_id
+
+
+async def create_or_enable_user_keycloak(token: str, user_data: dict) -> tuple:
+    """
+    Create a user in Keycloak, or enable an existing one and reset its password.
+    Returns the Keycloak user id and whether this call created the user.
+    """
+    url = keycloak_client.admin_url("users")
+
+    email = user_data.get("email")
+    username = user_data.get("username")
+
+    keycloak_user = await get_user_keycloak(token, username=username, email=email)
+    # If user already exists, enable the user if it is disabled
+    if keycloak_user:
+        keycloak_user_id = keycloak_user["id"]
+        await enable_disable_user_keycloak(
+            token=token,
+            keycloak_user_id=keycloak_user_id,
+            enable=True
+        )
+        new_password = user_data.get("credentials", [{}])[0].get("value")
+        await reset_password_keycloak(token, keycloak_user_id, new_password)
+
+        return keycloak_user["id"], False
+
+    # If user does not exist, create a new one
+    response = await _admin_request("POST", url, token, operation="admin.create_user", json=user_data)
+
+    if response.status_code not in [201, 204]:
+        raise Exception(f"Failed to create user in Keycloak: {response.text}")
+
+    # Retrieve Keycloak User ID
+    keycloak_user_id = response.headers.get("Location", "").split("/")[-1]
+    if not keycloak_user_id:
+        raise Exception("Failed to extract Keycloak user ID from response headers.")
+
+    return keycloak_user_id, True
+
+
+async def partial_import_users_keycloak(
+    token: str,
+    users: list,
+    if_resource_exists: str = "SKIP"
+):
+    """
+    Create many users in one call through the realm partial import.
+    Returns one result (action, resourceName, id) per user.
+    """
+    url = keycloak_client.admin_url("partialImport")
+    payload = {"ifResourceExists": if_resource_exists, "users": users}
+
+    response = await _admin_request("POST", url, token, operation="admin.partial_import", json=payload)
+    if not response.is_success:
+        raise Exception(f"Failed to import users in Keycloak: {response.text}")
+
+    return response.json().get("results", [])
+
+
+async def get_user_keycloak(token: str, username: str = None, email: str = None):
+    """
+    Retrieve a user from Keycloak by username or email.
+    """
+    url = keycloak_client.admin_url("users")
+    if email:
+        params = {"email": email}
+    elif username:
+        params = {"username": username}
+    else:
+        raise ValueError("Either 'username' or 'email' must be provided to search for a user.")
+
+    response = await _admin_request("GET", url, token, operation="admin.get_user", params=params)
+    if response.status_code != 200:
+        raise Exception(f"Failed to search user in Keycloak: {response.text}")
+    users = response.json()
+    return users[0] if users else None
+
+
+async def enable_disable_user_keycloak(
+    token: str,
+    keycloak_user_id: str,
+    enable: bool = True
+):
+    url = keycloak_client.admin_url(f"users/{keycloak_user_id}")
+
+    payload = {"enabled": True if enable else False}
+
+    response = await _admin_request("PUT", url, token, operation="admin.update_user", json=payload)
+    if response.status_code not in [204, 200]:
+        raise Exception(f"Failed to {'enable' if enable else 'disable'} user in Keycloak: {response.text}")
+
+    return {"msg": f"User {'enabled' if enable else 'disabled'} successfully"}
+
+
+async def delete_user_keycloak(token: str, keycloak_user_id: str):
+    """
+    Delete a user from Keycloak. A user that is already gone is not an error.
+    """
+    url = keycloak_client.admin_url(f"users/{keycloak_user_id}")
+
+    response = await _admin_request("DELETE", url, token, operation="admin.delete_user")
+    if response.status_code not in [204, 200, 404]:
+        raise Exception(f"Failed to delete user in Keycloak: {response.text}")
+
+
+async def send_email_verification_link(
+    token: str,
+    user_id: str,
+    redirect_url: str = None
+):
+    """
+    Send an email verification link to the user.
+    """
+    url = keycloak_client.admin_url(f"users/{user_id}/execute-actions-email")
+    params = {"redirect_uri": redirect_url} if redirect_url else {}
+    data = ["VERIFY_EMAIL"]
+
+    response = await _admin_request("PUT", url, token, operation="admin.execute_actions_email", params=params, json=data)
+    response.raise_for_status()
+    return response.status_code
+
+
+async def reset_password_keycloak(
+    token: str,
+    user_id: str,
+    new_password: str
+):
+    """
+    Reset the password for a user in Keycloak.
+    """
+    url = keycloak_client.admin_url(f"users/{user_id}/reset-password")
+    payload = {
+        "type": "password",
+        "temporary": False,
+        "value": new_password
+    }
+
+    response = await _admin_request("PUT", url, token, operation="admin.reset_password", json=payload)
+    if not response.is_success:
+        raise Exception(f"Failed to reset password in Keycloak: {response.text}")
+
+
+async def get_user_by_id_keycloak(token: str, keycloak_user_id: str):
+    """
+    Retrieve a user from Keycloak by id. Returns None if the user does not exist.
+    """
+    url = keycloak_client.admin_url(f"users/{keycloak_user_id}")
+
+    response = await _admin_request("GET", url, token, operation="admin.get_user")
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise Exception(f"Failed to get user from Keycloak: {response.text}")
+    return response.json()
+
+
+async def list_users_keycloak(token: str, first: int = 0, max_results: int = 100):
+    """
+    Retrieve a page of users from Keycloak, in their brief representation.
+    """
+    url = keycloak_client.admin_url("users")
+    params = {"first": first, "max": max_results, "briefRepresentation": "true"}
+
+    response = await _admin_request("GET", url, token, operation="admin.list_users", params=params)
+    if response.status_code != 200:
+        raise Exception(f"Failed to list users in Keycloak: {response.text}")
+    return response.json()
+
+
+async def get_events_keycloak(token: str, admin: bool = False, first: int = 0, max_results: int = 100, **filters):
+    """
+    Retrieve a page of realm user events (or admin events), newest first.
+    `filters` are passed as query parameters, e.g. type=[...], dateFrom="2025-01-31".
+    """
+    url = keycloak_client.admin_url("admin-events" if admin else "events")
+    params = {**filters, "first": first, "max": max_results}
+
+    response = await _admin_request(
+        "GET", url, token, operation="admin.admin_events" if admin else "admin.events", params=params
+    )
+    if response.status_code != 200:
+        raise Exception(f"Failed to read {'admin ' if admin else ''}events from Keycloak: {response.text}")
+    return response.json()
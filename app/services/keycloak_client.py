@@ -0,0 +1,102 @@
+import asyncio
+import random
+import time
+import httpx
+
+from app.services.metrics import observe_keycloak_call
+
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+# Gateway errors worth retrying; only applied to idempotent methods
+RETRY_STATUS_CODES = (502, 503, 504)
+IDEMPOTENT_METHODS = frozenset({"DELETE", "GET", "HEAD", "OPTIONS", "PUT", "TRACE"})
+
+
+class KeycloakURLs:
+    """
+    URL and header construction for the Keycloak realm, OIDC and admin APIs.
+    """
+
+    def __init__(self, server_url: str, realm: str):
+        self.server_url = (server_url or "").rstrip("/")
+        self.realm = realm
+
+    def realm_url(self, path: str = "") -> str:
+        return f"{self.server_url}/realms/{self.realm}/{path}".rstrip("/")
+
+    def oidc_url(self, endpoint: str) -> str:
+        return self.realm_url(f"protocol/openid-connect/{endpoint}")
+
+    def admin_url(self, path: str = "") -> str:
+        return f"{self.server_url}/admin/realms/{self.realm}/{path}".rstrip("/")
+
+    @staticmethod
+    def bearer_headers(token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+
+
+class AsyncKeycloakClient(KeycloakURLs):
+    """
+    Shared HTTP client for Keycloak built on `httpx.AsyncClient`.
+
+    One keep-alive connection pool is shared by every coroutine in the worker,
+    so a single event loop can keep many Keycloak calls in flight. Requests
+    have connect and read timeouts; idempotent methods (GET, PUT, DELETE, ...)
+    are retried with jittered exponential backoff, POST requests such as token
+    grants and user creation never are.
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        realm: str,
+        pool_size: int = 20,
+        connect_timeout: float = 3,
+        read_timeout: float = 10,
+        retries: int = 3,
+        backoff_factor: float = 0.2,
+    ):
+        super().__init__(server_url, realm)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_factor)
+
+    async def request(self, method: str, url: str, operation: str = "other", **kwargs) -> httpx.Response:
+        """
+        Send a request, recording its latency (retries included) and outcome under `operation`.
+        """
+        retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+        started = time.perf_counter()
+
+        for attempt in range(retries + 1):
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= retries:
+                    observe_keycloak_call(operation, started, error=e)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    observe_keycloak_call(operation, started, status_code=response.status_code)
+                    return response
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def post_form(self, endpoint: str, data: dict, operation: str = None) -> httpx.Response:
+        """
+        POST a form to an OpenID Connect endpoint (token, logout, introspect, ...).
+        """
+        return await self.request(
+            "POST", self.oidc_url(endpoint), operation=operation or endpoint, data=data, headers=FORM_HEADERS
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
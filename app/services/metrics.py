@@ -0,0 +1,175 @@
+import os
+import time
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.database import get_pool_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+http_requests_total = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status code",
+    ["method", "route", "status"],
+)
+
+keycloak_request_duration = Histogram(
+    "keycloak_request_duration_seconds",
+    "Keycloak upstream call latency by operation",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+keycloak_requests_total = Counter(
+    "keycloak_requests_total",
+    "Keycloak upstream calls by operation and status code",
+    ["operation", "status"],
+)
+keycloak_request_errors_total = Counter(
+    "keycloak_request_errors_total",
+    "Keycloak upstream failures (transport errors and 5xx) by operation",
+    ["operation", "reason"],
+)
+
+login_rate_limited_total = Counter(
+    "login_rate_limited_total",
+    "Login attempts rejected by the rate limiter, by bucket scope",
+    ["scope"],
+)
+
+token_revocations_total = Counter(
+    "token_revocations_total",
+    "Sessions (sid) and tokens (jti) added to the revocation index by logout",
+    ["kind"],
+)
+revoked_tokens_rejected_total = Counter(
+    "revoked_tokens_rejected_total",
+    "Otherwise valid tokens rejected because their session or token was revoked",
+)
+
+user_sync_runs_total = Counter(
+    "user_sync_runs_total",
+    "Keycloak to database sync passes by kind (events, full) and result",
+    ["kind", "result"],
+)
+user_sync_users_checked_total = Counter(
+    "user_sync_users_checked_total",
+    "Users whose Keycloak state was compared with the database",
+)
+user_sync_changes_total = Counter(
+    "user_sync_changes_total",
+    "User rows changed by the sync, by field",
+    ["field"],
+)
+user_sync_event_lag = Histogram(
+    "user_sync_event_lag_seconds",
+    "Delay between a Keycloak event and its change reaching the database",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+user_sync_last_success = Gauge(
+    "user_sync_last_success_timestamp_seconds",
+    "Unix time of the last successful sync pass",
+    multiprocess_mode="max",
+)
+
+
+def observe_keycloak_call(operation: str, started: float, status_code: int = None, error: Exception = None):
+    """
+    Record one Keycloak call. Pass `status_code` for a response or `error` for a transport failure.
+    """
+    keycloak_request_duration.labels(operation).observe(time.perf_counter() - started)
+    if error is not None:
+        keycloak_requests_total.labels(operation, "error").inc()
+        keycloak_request_errors_total.labels(operation, type(error).__name__).inc()
+        return
+    keycloak_requests_total.labels(operation, str(status_code)).inc()
+    if status_code >= 500:
+        keycloak_request_errors_total.labels(operation, f"http_{status_code}").inc()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and status per route template.
+    Unmatched paths share one label so scanners can't blow up cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.labels(method, path).observe(time.perf_counter() - started)
+            http_requests_total.labels(method, path, str(status["code"])).inc()
+
+
+class DBPoolCollector:
+    """
+    Exposes SQLAlchemy pool usage and checkout waits at scrape time.
+    """
+
+    def collect(self):
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"]),
+            "checked_in": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["engine"]),
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Overflow connections in use", labels=["engine"]),
+            "checkout_wait_seconds_max": GaugeMetricFamily(
+                "db_pool_checkout_wait_seconds_max", "Longest checkout wait", labels=["engine"]
+            ),
+        }
+        counters = {
+            "checkouts": CounterMetricFamily("db_pool_checkouts", "Pool checkouts", labels=["engine"]),
+            "checkout_timeouts": CounterMetricFamily(
+                "db_pool_checkout_timeouts", "Checkouts that timed out", labels=["engine"]
+            ),
+            "checkout_wait_seconds_total": CounterMetricFamily(
+                "db_pool_checkout_wait_seconds", "Time spent waiting for a connection", labels=["engine"]
+            ),
+        }
+
+        for engine_name, stats in get_pool_stats().items():
+            for key, metric in {**gauges, **counters}.items():
+                metric.add_metric([engine_name], stats[key])
+
+        yield from gauges.values()
+        yield from counters.values()
+
+
+REGISTRY.register(DBPoolCollector())
+
+
+def render_metrics() -> bytes:
+    """
+    Text exposition of the metrics. Under several gunicorn workers
+    (PROMETHEUS_MULTIPROC_DIR set) request metrics are aggregated across
+    workers; pool gauges are those of the worker serving the scrape.
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest()
+
+    from prometheus_client import multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(DBPoolCollector())
+    return generate_latest(registry)
@@ -0,0 +1,187 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+
+from app.config import (
+    LOGIN_RATE_LIMIT_ENABLED,
+    LOGIN_RATE_LIMIT_USERNAME_BURST,
+    LOGIN_RATE_LIMIT_USERNAME_PER_MINUTE,
+    LOGIN_RATE_LIMIT_IP_BURST,
+    LOGIN_RATE_LIMIT_IP_PER_MINUTE,
+    LOGIN_RATE_LIMIT_MAX_KEYS,
+    LOGIN_RATE_LIMIT_REDIS_URL,
+    LOGIN_RATE_LIMIT_TRUST_FORWARDED_FOR,
+)
+from app.services.metrics import login_rate_limited_total
+
+
+class InMemoryRateLimitBackend:
+    """
+    Token buckets held in process memory, bounded to `max_keys` buckets.
+    The least recently used bucket is evicted first; an evicted key simply
+    starts again with a full bucket.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, burst: int, rate: float, cost: float = 1) -> float:
+        """
+        Take `cost` tokens from the bucket of `key`, refilled at `rate` tokens per second.
+        Returns 0 if allowed, otherwise the seconds until enough tokens are available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+
+            retry_after = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                retry_after = (cost - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisRateLimitBackend:
+    """
+    Token buckets in Redis, shared by every worker. Each take is one atomic
+    script call; idle buckets expire once they would be full again.
+    """
+
+    TAKE_SCRIPT = """
+    local burst = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local clock = redis.call("TIME")
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+    local tokens = tonumber(bucket[1]) or burst
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated_at) * rate)
+
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+
+    redis.call("HSET", KEYS[1], "tokens", tokens, "updated_at", now)
+    redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000))
+    return tostring(retry_after)
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(self.TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise Exception("The redis package is required for a Redis rate limit backend")
+        return cls(redis.from_url(url), **kwargs)
+
+    async def take(self, key: str, burst: int, rate: float, cost: float = 1) -> float:
+        retry_after = await self._take(keys=[self.prefix + key], args=[burst, rate, cost])
+        return float(retry_after)
+
+
+class RateLimitPolicy:
+    """
+    A token bucket allowing `burst` attempts at once and `per_minute` on average.
+    """
+
+    def __init__(self, scope: str, burst: int, per_minute: float):
+        self.scope = scope
+        self.burst = burst
+        self.rate = per_minute / 60
+
+    def key(self, value: str) -> str:
+        return f"{self.scope}:{value}"
+
+
+class LoginRateLimiter:
+    """
+    Throttles login attempts per client IP and per username from that IP.
+
+    The IP bucket is checked first and an attempt it rejects doesn't use up
+    the username's tokens. The username bucket is keyed by IP, so attempts
+    from other addresses, however many, can't lock the account's owner out.
+    """
+
+    def __init__(self, backend, username_policy: RateLimitPolicy, ip_policy: RateLimitPolicy):
+        self.backend = backend
+        self.username_policy = username_policy
+        self.ip_policy = ip_policy
+
+    async def check(self, username: str, client_ip: str) -> float:
+        """
+        Consume one attempt. Returns 0 if the attempt is allowed, otherwise the seconds to wait.
+        """
+        username = (username or "").strip().lower()
+        checks = (
+            (self.ip_policy, client_ip),
+            (self.username_policy, username and f"{username}@{client_ip}"),
+        )
+        for policy, value in checks:
+            if not value:
+                continue
+            wait = await self.backend.take(policy.key(value), policy.burst, policy.rate)
+            if wait:
+                login_rate_limited_total.labels(policy.scope).inc()
+                return wait
+        return 0.0
+
+
+def _rate_limit_backend():
+    if LOGIN_RATE_LIMIT_REDIS_URL:
+        return RedisRateLimitBackend.from_url(LOGIN_RATE_LIMIT_REDIS_URL)
+    return InMemoryRateLimitBackend(max_keys=LOGIN_RATE_LIMIT_MAX_KEYS)
+
+
+login_rate_limiter = LoginRateLimiter(
+    _rate_limit_backend(),
+    username_policy=RateLimitPolicy("login:user", LOGIN_RATE_LIMIT_USERNAME_BURST, LOGIN_RATE_LIMIT_USERNAME_PER_MINUTE),
+    ip_policy=RateLimitPolicy("login:ip", LOGIN_RATE_LIMIT_IP_BURST, LOGIN_RATE_LIMIT_IP_PER_MINUTE),
+)
+
+
+def client_ip(request: Request) -> str:
+    if LOGIN_RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else ""
+
+
+async def limit_login_attempts(request: Request, username: str):
+    """
+    FastAPI dependency rejecting login attempts over the limit with a 429,
+    before the password grant reaches Keycloak.
+    """
+    if not LOGIN_RATE_LIMIT_ENABLED:
+        return
+
+    retry_after = await login_rate_limiter.check(username, client_ip(request))
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
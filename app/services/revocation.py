@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from jose import jwt, JWTError
+
+from app.config import (
+    KEYCLOAK_ACCESS_TOKEN_LIFESPAN,
+    KEYCLOAK_TOKEN_VALIDATION_MODE,
+    WEB_CONCURRENCY,
+    REVOCATION_BUCKET_SECONDS,
+    REVOCATION_BLOOM_BITS,
+    REVOCATION_BLOOM_HASHES,
+)
+from app.services.cache import cache_backend
+from app.services.metrics import token_revocations_total
+
+logger = logging.getLogger(__name__)
+
+# Tokens issued up to this long after a worker subscribed may come from a Keycloak clock
+# that runs ahead of ours, so they are also checked against the shared backend
+CLOCK_SKEW = 30
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, a false positive
+    rate set by `bits`, `hashes` and the number of entries.
+    """
+
+    def __init__(self, bits: int, hashes: int = 4):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=8 * self.hashes).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 8:(i + 1) * 8], "big") % self.bits
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationIndex:
+    """
+    Logged-out sessions (`sid`) and tokens (`jti`), checked by local token
+    validation without asking Keycloak.
+
+    Entries are grouped in time buckets by expiry, so expired entries are
+    dropped a bucket at a time. An optional Bloom filter answers most lookups
+    of tokens that were never revoked; its hits are confirmed in the exact index.
+
+    Revocations are published on the cache backend, which on a shared backend
+    reaches every worker (in process, only this one). There each one is also
+    stored under its own key, so a worker that started after a revocation
+    finds it for tokens issued before it started.
+    """
+
+    CHANNEL = "revocations"
+    KEY_PREFIX = "revoked:"
+
+    def __init__(self, backend, bucket_seconds: int = 60, bloom_bits: int = 0, bloom_hashes: int = 4):
+        self.backend = backend
+        self.bucket_seconds = bucket_seconds
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.since = None
+        self._entries = {}
+        self._buckets = {}
+        self._bloom = BloomFilter(bloom_bits, bloom_hashes) if bloom_bits else None
+        self._next_purge = float("inf")
+        self._lock = threading.Lock()
+        backend.on(self.CHANNEL, self._on_message)
+
+    def start(self):
+        """
+        Mark the point from which published revocations reach this worker.
+        Call it once the cache backend has started.
+        """
+        self.since = time.time()
+        if KEYCLOAK_TOKEN_VALIDATION_MODE != "introspect" and WEB_CONCURRENCY > 1 and not self.backend.shared:
+            logger.warning(
+                "Logouts only revoke locally validated tokens in the worker that handled them: "
+                "%d workers need a shared cache backend (CACHE_BACKEND_URL)",
+                WEB_CONCURRENCY,
+            )
+
+    def add(self, key: str, expires_at: float):
+        """
+        Record `key` ("sid:<sid>" or "jti:<jti>") until `expires_at` in this worker only.
+        """
+        if expires_at <= time.time():
+            return
+        bucket = int(expires_at // self.bucket_seconds) + 1
+        with self._lock:
+            if self._entries.get(key, 0) >= expires_at:
+                return
+            self._entries[key] = expires_at
+            self._buckets.setdefault(bucket, set()).add(key)
+            if self._bloom is not None:
+                self._bloom.add(key)
+            self._next_purge = min(self._next_purge, bucket * self.bucket_seconds)
+
+    def _purge(self, now: float):
+        with self._lock:
+            expired = [bucket for bucket in self._buckets if bucket * self.bucket_seconds <= now]
+            for bucket in expired:
+                for key in self._buckets.pop(bucket):
+                    # Revoked again with a later expiry: the key lives on in a later bucket
+                    if self._entries.get(key, 0) <= now:
+                        self._entries.pop(key, None)
+            if expired and self._bloom is not None:
+                self._bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+                for key in self._entries:
+                    self._bloom.add(key)
+            self._next_purge = min(self._buckets, default=float("inf")) * self.bucket_seconds
+
+    def _contains(self, key: str, now: float) -> bool:
+        if self._bloom is not None and key not in self._bloom:
+            return False
+        return self._entries.get(key, 0) > now
+
+    @staticmethod
+    def _keys(claims: dict) -> list:
+        return [f"{kind}:{claims[kind]}" for kind in ("sid", "jti") if claims.get(kind)]
+
+    def is_revoked(self, claims: dict) -> bool:
+        """
+        Whether the token's session or the token itself was revoked, from this worker's index.
+        """
+        now = time.time()
+        if now >= self._next_purge:
+            self._purge(now)
+        return any(self._contains(key, now) for key in self._keys(claims))
+
+    async def is_revoked_async(self, claims: dict) -> bool:
+        """
+        Like `is_revoked`; tokens issued before this worker subscribed are also
+        looked up on the shared backend.
+        """
+        if self.is_revoked(claims):
+            return True
+        if not self.backend.shared:
+            return False
+        if self.since is not None and claims.get("iat", 0) > self.since + CLOCK_SKEW:
+            return False
+        for key in self._keys(claims):
+            expires_at = await self.backend.get(self.KEY_PREFIX + key)
+            if expires_at is not None:
+                self.add(key, expires_at)
+                return True
+        return False
+
+    async def revoke(self, kind: str, value: str, expires_at: float):
+        """
+        Revoke a session (`kind` "sid") or token ("jti") in every worker until `expires_at`.
+        """
+        key = f"{kind}:{value}"
+        self.add(key, expires_at)
+        token_revocations_total.labels(kind=kind).inc()
+        if self.backend.shared:
+            await self.backend.set(self.KEY_PREFIX + key, expires_at, ttl=expires_at - time.time())
+        await self.backend.publish(self.CHANNEL, json.dumps({"key": key, "expires_at": expires_at}))
+
+    async def revoke_token(self, token: str, session_lifetime: float = KEYCLOAK_ACCESS_TOKEN_LIFESPAN) -> bool:
+        """
+        Revoke the session (`sid`) of a refresh token Keycloak has already logged
+        out, until every access token issued for it has expired. Access tokens are
+        matched by `sid` alone, so a token without one revokes nothing.
+        """
+        try:
+            claims = jwt.get_unverified_claims(token)
+        except JWTError:
+            return False
+        if not claims.get("sid"):
+            logger.warning("Logged out token has no sid: its access tokens stay valid until they expire")
+            return False
+        await self.revoke("sid", claims["sid"], time.time() + session_lifetime)
+        return True
+
+    def _on_message(self, message: str):
+        try:
+            revocation = json.loads(message)
+            self.add(revocation["key"], float(revocation["expires_at"]))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed revocation message %r", message)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Handlers are registered here, at import, before the cache backend starts listening
+revocation_index = RevocationIndex(
+    cache_backend,
+    bucket_seconds=REVOCATION_BUCKET_SECONDS,
+    bloom_bits=REVOCATION_BLOOM_BITS,
+    bloom_hashes=REVOCATION_BLOOM_HASHES,
+)
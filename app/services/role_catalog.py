@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import ROLE_CATALOG_CACHE_TTL
+from app.crud.role import get_roles_with_capabilities
+from app.models.user import Role, Capability, RoleCapability
+from app.schemas.role import RoleCapabilitiesRead
+
+CATALOG_MODELS = (Role, Capability, RoleCapability)
+CATALOG_TABLES = {model.__table__ for model in CATALOG_MODELS}
+
+catalog_adapter = TypeAdapter(List[RoleCapabilitiesRead])
+
+
+class RoleCatalogCache:
+    """
+    In-process cache of the serialized role/capability catalog and its ETag.
+    """
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self._entry = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, session: Session):
+        """
+        Return `(body, etag)`, loading and serializing the catalog on a miss.
+        """
+        entry = self._entry
+        if entry is not None and entry[2] > time.monotonic():
+            return entry[0], entry[1]
+
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[2] > time.monotonic():
+                return entry[0], entry[1]
+
+            version = self._version
+            roles = get_roles_with_capabilities(session)
+            body = catalog_adapter.dump_json(catalog_adapter.validate_python(roles, from_attributes=True))
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+            # Don't cache a catalog that was invalidated while it was being loaded
+            if version == self._version:
+                self._entry = (body, etag, time.monotonic() + self.ttl)
+            return body, etag
+
+    def invalidate(self):
+        self._version += 1
+        self._entry = None
+
+
+role_catalog_cache = RoleCatalogCache(ttl=ROLE_CATALOG_CACHE_TTL)
+
+
+def invalidate_role_catalog():
+    role_catalog_cache.invalidate()
+
+
+# Invalidate the catalog whenever a transaction touching roles or capabilities commits
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_changes(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, CATALOG_MODELS):
+            session.info["role_catalog_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_catalog_statements(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None and table in CATALOG_TABLES:
+        orm_execute_state.session.info["role_catalog_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop("role_catalog_dirty", False):
+        invalidate_role_catalog()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop("role_catalog_dirty", None)
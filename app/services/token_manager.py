@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+
+class AsyncServiceAccountTokenManager:
+    """
+    Process-wide cache for the client_credentials (service account) token.
+
+    The token is refreshed `refresh_margin` seconds before `expires_in`.
+    `fetch_token` is a coroutine function; refreshes are single-flight per
+    event loop through an `asyncio.Lock`, so concurrent callers wait for one
+    grant request and share its result instead of each minting a new token.
+
+    With a `cache`, the token is also shared through it, so workers reuse
+    one grant instead of each running their own.
+    """
+
+    CACHE_KEY = "token"
+
+    def __init__(self, fetch_token, refresh_margin: int = 30, cache=None):
+        self._fetch_token = fetch_token
+        self._refresh_margin = refresh_margin
+        self._token = None
+        self._previous_access_token = None
+        self._refresh_at = 0.0
+        self._async_lock = None
+        self._cache = cache
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and time.monotonic() < self._refresh_at
+
+    def _store(self, token: dict, expires_in: float = None):
+        if "access_token" not in token:
+            raise Exception(f"Failed to obtain service account token: {token}")
+        if expires_in is None:
+            expires_in = token.get("expires_in", 60)
+        margin = min(self._refresh_margin, expires_in / 2)
+        if self._token is not None:
+            self._previous_access_token = self._token["access_token"]
+        self._token = token
+        self._refresh_at = time.monotonic() + expires_in - margin
+
+    def owns(self, access_token: str) -> bool:
+        """
+        True if `access_token` is the cached token.
+        """
+        token = self._token
+        return token is not None and token["access_token"] == access_token
+
+    def issued(self, access_token: str) -> bool:
+        """
+        True if `access_token` is the cached token or the one it replaced.
+        """
+        return self.owns(access_token) or access_token == self._previous_access_token
+
+    def invalidate(self, access_token: str = None):
+        """
+        Drop the cached token, e.g. after the admin API answered 401.
+        If `access_token` is given, only invalidate if it is still the cached one.
+        """
+        if access_token is None or self.owns(access_token):
+            if self._token is not None:
+                self._previous_access_token = self._token["access_token"]
+            self._token = None
+            self._refresh_at = 0.0
+
+    async def _fetch_shared(self) -> dict:
+        async def fetch():
+            token = await self._fetch_token()
+            if "access_token" not in token:
+                raise Exception(f"Failed to obtain service account token: {token}")
+            return {"token": token, "expires_at": time.time() + token.get("expires_in", 60)}
+
+        def ttl(entry):
+            return entry["expires_at"] - time.time() - self._refresh_margin
+
+        return await self._cache.get_or_compute(self.CACHE_KEY, fetch, ttl=ttl)
+
+    async def get_token(self) -> dict:
+        """
+        Return the cached token response, running the grant only when it is due.
+        """
+        if self._is_fresh():
+            return self._token
+
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+
+        async with self._async_lock:
+            if not self._is_fresh():
+                if self._cache is None:
+                    self._store(await self._fetch_token())
+                else:
+                    entry = await self._fetch_shared()
+                    self._store(entry["token"], expires_in=entry["expires_at"] - time.time())
+            return self._token
+
+    async def get_access_token(self) -> str:
+        return (await self.get_token())["access_token"]
+
+    async def invalidate_async(self, access_token: str = None):
+        """
+        `invalidate`, also dropping the token from the shared cache before returning.
+        """
+        if self._cache is not None and (access_token is None or self.owns(access_token)):
+            await self._cache.delete(self.CACHE_KEY)
+        self.invalidate(access_token)
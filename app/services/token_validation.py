@@ -0,0 +1,161 @@
+import hashlib
+import time
+from jose import jwt, JWTError
+
+from app.config import (
+    KEYCLOAK_TOKEN_VALIDATION_MODE,
+    KEYCLOAK_ISSUER,
+    KEYCLOAK_ALLOWED_AZP,
+    KEYCLOAK_INTROSPECTION_CACHE_TTL,
+    KEYCLOAK_INTROSPECTION_CACHE_SIZE,
+)
+from app.services.cache import TTLCache
+from app.services.jwks import SUPPORTED_ALGORITHMS
+from app.services.metrics import revoked_tokens_rejected_total
+from app.services.revocation import revocation_index
+from app.services import keycloak_async_service
+
+VALIDATION_MODES = ("introspect", "local", "local_with_fallback")
+
+INACTIVE_TOKEN = {"active": False}
+
+introspection_cache = TTLCache(
+    maxsize=KEYCLOAK_INTROSPECTION_CACHE_SIZE,
+    ttl=KEYCLOAK_INTROSPECTION_CACHE_TTL,
+)
+
+
+class LocalValidationUnavailable(Exception):
+    """
+    Raised when a token cannot be checked without asking Keycloak,
+    e.g. refresh tokens signed with the realm HMAC key.
+    """
+
+
+def _to_introspection_response(claims: dict) -> dict:
+    """
+    Shape decoded claims like Keycloak's introspection endpoint does.
+    """
+    response = dict(claims)
+    response.setdefault("client_id", claims.get("azp"))
+    response.setdefault("username", claims.get("preferred_username"))
+    response.setdefault("token_type", claims.get("typ"))
+    response["active"] = True
+    return response
+
+
+def _signing_key_id(token: str):
+    """
+    Return the `kid` of a token that can be verified locally.
+    Raises `LocalValidationUnavailable` otherwise, and `JWTError` for garbage.
+    """
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") not in SUPPORTED_ALGORITHMS:
+        raise LocalValidationUnavailable(f"Unsupported signing algorithm '{header.get('alg')}'.")
+    return header.get("kid")
+
+
+def _verify_claims(token: str, key) -> dict:
+    """
+    Check signature, exp, nbf, iss and azp. Returns an introspection-shaped response.
+    """
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=list(SUPPORTED_ALGORITHMS),
+            issuer=KEYCLOAK_ISSUER,
+            options={"verify_aud": False, "require_exp": True},
+        )
+    except JWTError:
+        return dict(INACTIVE_TOKEN)
+
+    if KEYCLOAK_ALLOWED_AZP and claims.get("azp") not in KEYCLOAK_ALLOWED_AZP:
+        return dict(INACTIVE_TOKEN)
+
+    return _to_introspection_response(claims)
+
+
+def _introspection_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _cache_introspection(cache_key: str, response: dict):
+    if "active" not in response:
+        # Error from Keycloak (e.g. bad client credentials), don't cache it
+        return
+
+    ttl = KEYCLOAK_INTROSPECTION_CACHE_TTL
+    if response.get("active") and "exp" in response:
+        ttl = min(ttl, response["exp"] - time.time())
+    introspection_cache.set(cache_key, response, ttl=ttl)
+
+
+def _rejected() -> dict:
+    revoked_tokens_rejected_total.inc()
+    return dict(INACTIVE_TOKEN)
+
+
+def _check_mode(mode: str) -> str:
+    mode = mode or KEYCLOAK_TOKEN_VALIDATION_MODE
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"Unknown token validation mode '{mode}'.")
+    return mode
+
+
+async def validate_token_locally_async(token: str) -> dict:
+    """
+    Check signature, exp, nbf, iss and azp against the cached JWKS.
+    Returns an introspection-shaped response.
+    """
+    try:
+        kid = _signing_key_id(token)
+    except JWTError:
+        return dict(INACTIVE_TOKEN)
+
+    try:
+        key = await keycloak_async_service.get_keycloak_public_key(kid)
+    except Exception as e:
+        raise LocalValidationUnavailable(str(e))
+
+    return _verify_claims(token, key)
+
+
+async def introspect_token_async(token: str) -> dict:
+    """
+    Introspect a token in Keycloak, caching the result until the token expires.
+    """
+    cache_key = _introspection_cache_key(token)
+    cached = introspection_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = await keycloak_async_service.check_token_validity(token)
+    _cache_introspection(cache_key, response)
+    return response
+
+
+async def validate_token_async(token: str, mode: str = None) -> dict:
+    """
+    Validate a token using the configured mode:
+    - "introspect": always ask Keycloak (results cached up to the token's exp).
+    - "local": verify the token against the cached JWKS only.
+    - "local_with_fallback": verify locally, introspect what can't be checked locally.
+    Active tokens whose session or jti was logged out are reported inactive,
+    including introspection results cached before the logout.
+    """
+    mode = _check_mode(mode)
+
+    if mode == "introspect":
+        response = await introspect_token_async(token)
+    else:
+        try:
+            response = await validate_token_locally_async(token)
+        except LocalValidationUnavailable:
+            if mode != "local_with_fallback":
+                return dict(INACTIVE_TOKEN)
+            response = await introspect_token_async(token)
+
+    if response.get("active") and await revocation_index.is_revoked_async(response):
+        return _rejected()
+    return response
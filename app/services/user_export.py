@@ -0,0 +1,60 @@
+import csv
+import io
+from datetime import datetime
+from pydantic_core import to_json
+
+from app.config import USERS_EXPORT_BATCH_SIZE
+from app.crud.user import stream_users_async
+from app.database import AsyncSessionLocal
+from app.schemas.user import UserRead
+
+EXPORT_FIELDS = list(UserRead.model_fields)
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_export_fields(fields: str = None) -> list:
+    """
+    Parse a comma-separated field projection, defaulting to every `UserRead` field.
+    """
+    if not fields:
+        return EXPORT_FIELDS
+
+    columns = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [column for column in columns if column not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    return columns
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def export_users(export_format: str, columns: list, **filters):
+    """
+    Yield the user directory as NDJSON or CSV text chunks, one chunk per cursor batch.
+    Opens its own session since it outlives the request dependencies.
+    """
+    async with AsyncSessionLocal() as session:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+
+        async for rows in stream_users_async(session, columns, batch_size=USERS_EXPORT_BATCH_SIZE, **filters):
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+            else:
+                # Encoded by pydantic-core, which handles UUIDs and datetimes natively
+                yield b"".join(to_json(dict(zip(columns, row))) + b"\n" for row in rows)
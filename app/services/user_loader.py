@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import USERS_LOOKUP_MAX_IDS
+from app.crud.user import get_users_by_ids_async
+from app.database import get_async_read_db
+
+
+class UserLoader:
+    """
+    Batches user lookups made in the same event loop iteration into one query.
+
+    `await loader.load(id)` from several coroutines (e.g. under `asyncio.gather`)
+    queues the ids; they are fetched together with `get_users_by_ids_async` on
+    the next loop iteration. Results are cached per id for the loader's lifetime,
+    so make one loader per request. Unknown or deleted users resolve to None.
+    """
+
+    def __init__(self, session: AsyncSession, key: str = "id", max_batch_size: int = USERS_LOOKUP_MAX_IDS):
+        if key not in ("id", "keycloak_id"):
+            raise ValueError("key must be 'id' or 'keycloak_id'")
+        self.session = session
+        self.key = key
+        self.max_batch_size = max_batch_size
+        self._futures = {}
+        self._queue = {}
+        # Batches in flight, referenced until they finish so they aren't garbage collected
+        self._tasks = set()
+        # An AsyncSession runs one statement at a time
+        self._lock = asyncio.Lock()
+
+    def load(self, key) -> asyncio.Future:
+        key = uuid.UUID(str(key))
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue[key] = future
+        return future
+
+    async def load_many(self, keys) -> list:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def clear(self, key=None):
+        """
+        Forget loaded results, of one key or all, so they are fetched again.
+        Loads still in flight are kept and resolve normally.
+        """
+        if key is None:
+            self._futures = {key: future for key, future in self._futures.items() if not future.done()}
+            return
+        key = uuid.UUID(str(key))
+        future = self._futures.get(key)
+        if future is not None and future.done():
+            del self._futures[key]
+
+    def _dispatch(self):
+        batch, self._queue = list(self._queue.items()), {}
+        for start in range(0, len(batch), self.max_batch_size):
+            task = asyncio.ensure_future(self._load_batch(dict(batch[start:start + self.max_batch_size])))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self, futures: dict):
+        try:
+            async with self._lock:
+                rows = await get_users_by_ids_async(self.session, list(futures), key=self.key)
+        except Exception as e:
+            for key, future in futures.items():
+                # A failed load isn't cached
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {getattr(row, self.key): row for row in rows}
+        for key, future in futures.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+def get_user_loader(session: AsyncSession = Depends(get_async_read_db)) -> UserLoader:
+    """
+    Request-scoped `UserLoader` by user id, on a read session.
+    """
+    return UserLoader(session)
@@ -0,0 +1,174 @@
+import asyncio
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import KEYCLOAK_BULK_CONCURRENCY
+from app.crud.user import bulk_create_users_async
+from app.schemas.user import UserCreate, UserBulkResult
+from app.services.keycloak_async_service import (
+    get_token,
+    create_or_enable_user_keycloak,
+    delete_user_keycloak,
+    partial_import_users_keycloak,
+    send_email_verification_link,
+)
+
+
+def keycloak_user_payload(user_data: UserCreate) -> dict:
+    """
+    Keycloak user representation for a new user.
+    """
+    return {
+        "username": user_data.username,
+        "firstName": user_data.first_name,
+        "lastName": user_data.last_name,
+        "email": user_data.email,
+        "enabled": True,
+        "credentials": [{"type": "password", "value": user_data.password, "temporary": False}]
+    }
+
+
+async def _gather_bounded(limit: int, coroutines):
+    """
+    Run coroutines with at most `limit` in flight, returning results or exceptions in order.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(c) for c in coroutines), return_exceptions=True)
+
+
+async def _create_keycloak_users(token: str, users: list, use_partial_import: bool, concurrency: int) -> list:
+    """
+    Create users in Keycloak, returning per user a (keycloak id, created by
+    this call) pair, or an exception.
+    """
+    payloads = [keycloak_user_payload(user) for user in users]
+
+    if not use_partial_import:
+        return await _gather_bounded(
+            concurrency, (create_or_enable_user_keycloak(token, payload) for payload in payloads)
+        )
+
+    results = await partial_import_users_keycloak(token, payloads)
+    # Keycloak stores usernames in lowercase
+    added = {
+        result["resourceName"].lower(): result.get("id")
+        for result in results
+        if result.get("resourceType") == "USER" and result.get("action") == "ADDED"
+    }
+
+    # Users that already existed go through the regular path (enable + reset password)
+    keycloak_users = [(added.get(user.username.lower()), True) for user in users]
+    pending = [i for i, (keycloak_id, _) in enumerate(keycloak_users) if not keycloak_id]
+    fallback = await _gather_bounded(
+        concurrency, (create_or_enable_user_keycloak(token, payloads[i]) for i in pending)
+    )
+    for i, keycloak_user in zip(pending, fallback):
+        keycloak_users[i] = keycloak_user
+
+    return keycloak_users
+
+
+async def _delete_keycloak_users(token: str, results: list, records: list, concurrency: int):
+    """
+    Delete the Keycloak users of failed records, given as (index, keycloak id)
+    pairs, adding the id of any that could not be deleted to its result's error.
+    """
+    deletions = await _gather_bounded(
+        concurrency, (delete_user_keycloak(token, keycloak_id) for _, keycloak_id in records)
+    )
+    for (i, keycloak_id), deletion in zip(records, deletions):
+        if isinstance(deletion, Exception):
+            results[i].error += f"; Keycloak user {keycloak_id} could not be removed: {deletion}"
+
+
+async def bulk_create_users(
+    session: AsyncSession,
+    users: list,
+    use_partial_import: bool = False,
+    concurrency: int = KEYCLOAK_BULK_CONCURRENCY,
+) -> list:
+    """
+    Create a batch of users: Keycloak users with bounded concurrency (or one
+    partial import), local rows with one multi-row INSERT, then verification
+    emails. Returns a `UserBulkResult` per input record, in order.
+
+    Records rejected locally (email or phone number taken by another user)
+    have the Keycloak user this call created for them deleted again, so none
+    is left without a local row; if that fails its id is reported in the
+    error. Keycloak users that already existed are never deleted. The same
+    happens to every record if a concurrent write makes the INSERT fail.
+    """
+    token = (await get_token())["access_token"]
+
+    keycloak_users = await _create_keycloak_users(token, users, use_partial_import, concurrency)
+
+    results = [UserBulkResult(index=i, username=user.username, success=False) for i, user in enumerate(users)]
+    rows = []
+    new_keycloak_ids = set()
+    for i, (user, keycloak_user) in enumerate(zip(users, keycloak_users)):
+        if isinstance(keycloak_user, Exception):
+            results[i].error = str(keycloak_user)
+            continue
+        keycloak_id, is_new = keycloak_user
+        if is_new:
+            new_keycloak_ids.add(str(keycloak_id))
+        row = user.model_dump(exclude={"password"})
+        row["keycloak_id"] = keycloak_id
+        rows.append((i, row))
+
+    try:
+        created, rejected = await bulk_create_users_async(session, [row for _, row in rows])
+    except IntegrityError as e:
+        # Another request took an email or phone number after the conflict check
+        await session.rollback()
+        for i, _ in rows:
+            results[i].error = f"Conflicting user created concurrently, retry the record: {e.orig}"
+        await _delete_keycloak_users(
+            token,
+            results,
+            [(i, str(row["keycloak_id"])) for i, row in rows if str(row["keycloak_id"]) in new_keycloak_ids],
+            concurrency,
+        )
+        return results
+
+    for i, row in rows:
+        if str(row["keycloak_id"]) in rejected:
+            results[i].error = rejected[str(row["keycloak_id"])]
+
+    await _delete_keycloak_users(
+        token,
+        results,
+        [
+            (i, str(row["keycloak_id"])) for i, row in rows
+            if str(row["keycloak_id"]) in rejected and str(row["keycloak_id"]) in new_keycloak_ids
+        ],
+        concurrency,
+    )
+
+    verified = []
+    for i, row in rows:
+        keycloak_id = str(row["keycloak_id"])
+        if keycloak_id in rejected:
+            continue
+        created_user = created.get(keycloak_id)
+        if created_user is None:
+            results[i].error = "User already exists"
+            continue
+        results[i].success = True
+        results[i].user = created_user
+        verified.append(i)
+
+    email_results = await _gather_bounded(
+        concurrency,
+        (send_email_verification_link(token, str(results[i].user.keycloak_id)) for i in verified),
+    )
+    for i, email_result in zip(verified, email_results):
+        if isinstance(email_result, Exception):
+            results[i].error = f"Failed to send verification email: {email_result}"
+
+    return results
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.config import (
+    USER_SYNC_INTERVAL,
+    USER_SYNC_FULL_INTERVAL,
+    USER_SYNC_PAGE_SIZE,
+    KEYCLOAK_BULK_CONCURRENCY,
+    WEB_CONCURRENCY,
+)
+from app.crud.user import apply_keycloak_user_states_async, get_active_keycloak_ids_async
+from app.database import AsyncSessionLocal
+from app.services.cache import cache_backend
+from app.services.keycloak_async_service import (
+    get_events_keycloak,
+    get_user_by_id_keycloak,
+    list_users_keycloak,
+)
+from app.services.metrics import (
+    user_sync_runs_total,
+    user_sync_users_checked_total,
+    user_sync_changes_total,
+    user_sync_event_lag,
+    user_sync_last_success,
+)
+
+logger = logging.getLogger(__name__)
+
+# User events and admin operations that can change a user's email verification or existence
+USER_EVENT_TYPES = ["VERIFY_EMAIL", "UPDATE_EMAIL", "UPDATE_PROFILE", "DELETE_ACCOUNT"]
+ADMIN_OPERATION_TYPES = ["UPDATE", "DELETE"]
+
+
+def _keycloak_state(representation):
+    return None if representation is None else {"email_verified": bool(representation.get("emailVerified"))}
+
+
+def _admin_event_user_id(event: dict):
+    # resourcePath is "users/<id>" or "users/<id>/<sub-resource>"
+    parts = (event.get("resourcePath") or "").split("/")
+    return parts[1] if len(parts) > 1 and parts[0] == "users" else None
+
+
+class LeaseLost(Exception):
+    """
+    Another worker took the sync lease during a pass.
+    """
+
+
+class KeycloakUserSync:
+    """
+    Keeps `User.email_verified` and soft deletes in line with Keycloak.
+
+    Each pass reads the realm user events and admin events newer than the
+    stored high-water mark, fetches the users they touch and applies the
+    differences in batched UPDATEs. A full pass over the users API runs when
+    no high-water mark is stored and every `full_interval` seconds, catching
+    changes whose events were not recorded (events disabled or expired).
+
+    The state lives on the cache backend: on a shared backend one worker at a
+    time holds the sync lease and the others skip their passes. The lease is
+    renewed after every page, so it outlasts a long pass; a worker that loses
+    it stops its pass without storing state.
+    """
+
+    LEASE_KEY = "user-sync:lease"
+    STATE_KEY = "user-sync:state"
+    STATE_TTL = 30 * 24 * 3600
+    MAX_BACKOFF = 300
+
+    def __init__(
+        self,
+        backend,
+        session_factory=AsyncSessionLocal,
+        interval: float = USER_SYNC_INTERVAL,
+        full_interval: int = USER_SYNC_FULL_INTERVAL,
+        page_size: int = USER_SYNC_PAGE_SIZE,
+        concurrency: int = KEYCLOAK_BULK_CONCURRENCY,
+        workers: int = WEB_CONCURRENCY,
+    ):
+        self.backend = backend
+        self.session_factory = session_factory
+        self.interval = interval
+        self.full_interval = full_interval
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.workers = workers
+        self.owner = uuid.uuid4().hex
+
+    async def run(self):
+        """
+        Sync every `interval` seconds until cancelled. Failed passes are logged
+        and retried with exponential backoff, up to `MAX_BACKOFF` seconds apart.
+        """
+        if not self.backend.shared and self.workers > 1:
+            # Every worker would hold its own lease and scan Keycloak
+            logger.warning(
+                "Keycloak user sync not started: %d workers need a shared cache backend (CACHE_BACKEND_URL)",
+                self.workers,
+            )
+            return
+
+        failures = 0
+        while True:
+            try:
+                await self.sync_once()
+                failures = 0
+            except Exception:
+                failures += 1
+                if failures == 1:
+                    logger.exception("Keycloak user sync failed")
+                else:
+                    logger.warning("Keycloak user sync failed %d times in a row", failures)
+            await asyncio.sleep(min(self.interval * 2 ** failures, max(self.interval, self.MAX_BACKOFF)))
+
+    @property
+    def lease_ttl(self) -> float:
+        return self.interval * 3 + 10
+
+    async def _hold_lease(self) -> bool:
+        if not self.backend.shared:
+            return True
+        if await self.backend.add(self.LEASE_KEY, self.owner, self.lease_ttl):
+            return True
+        return await self.backend.renew(self.LEASE_KEY, self.owner, self.lease_ttl)
+
+    async def _renew_lease(self):
+        if self.backend.shared and not await self.backend.renew(self.LEASE_KEY, self.owner, self.lease_ttl):
+            raise LeaseLost()
+
+    async def sync_once(self) -> dict:
+        """
+        Run one pass if this worker holds the lease. Returns the rows changed per field.
+        """
+        if not await self._hold_lease():
+            return {}
+
+        state = await self.backend.get(self.STATE_KEY)
+        full_due = state is None or (self.full_interval and time.time() - state["full_at"] >= self.full_interval)
+        kind = "full" if full_due else "events"
+        try:
+            if full_due:
+                changes, state = await self._full_sync(state)
+            else:
+                changes, state = await self._event_sync(state)
+            await self._renew_lease()
+        except LeaseLost:
+            logger.warning("Keycloak user sync lease lost during a %s pass", kind)
+            user_sync_runs_total.labels(kind, "lease_lost").inc()
+            return {}
+        except Exception:
+            user_sync_runs_total.labels(kind, "error").inc()
+            raise
+
+        await self.backend.set(self.STATE_KEY, state, self.STATE_TTL)
+        user_sync_runs_total.labels(kind, "ok").inc()
+        user_sync_last_success.set(time.time())
+        return changes
+
+    async def _apply(self, states: dict) -> dict:
+        async with self.session_factory() as session:
+            changes = await apply_keycloak_user_states_async(session, states)
+        user_sync_users_checked_total.inc(len(states))
+        for field, count in changes.items():
+            user_sync_changes_total.labels(field).inc(count)
+        return changes
+
+    async def _fetch_states(self, user_ids) -> dict:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(user_id):
+            async with semaphore:
+                return user_id, _keycloak_state(await get_user_by_id_keycloak(None, user_id))
+
+        return dict(await asyncio.gather(*(fetch(user_id) for user_id in user_ids)))
+
+    async def _apply_by_id(self, user_ids) -> dict:
+        """
+        Look up users by id and apply their states, a page at a time.
+        """
+        user_ids = list(user_ids)
+        totals = {"email_verified": 0, "deleted": 0}
+        for start in range(0, len(user_ids), self.page_size):
+            changes = await self._apply(await self._fetch_states(user_ids[start:start + self.page_size]))
+            for field, count in changes.items():
+                totals[field] += count
+            await self._renew_lease()
+        return totals
+
+    async def _full_sync(self, state: dict):
+        started_ms = int(time.time() * 1000)
+        totals = {"email_verified": 0, "deleted": 0}
+
+        # Users created during the scan may be missing from it, so only earlier ones can be deleted
+        async with self.session_factory() as session:
+            local_ids = await get_active_keycloak_ids_async(session)
+
+        seen = set()
+        first = 0
+        while True:
+            users = await list_users_keycloak(None, first=first, max_results=self.page_size)
+            seen.update(uuid.UUID(user["id"]) for user in users)
+            changes = await self._apply({user["id"]: _keycloak_state(user) for user in users})
+            for field, count in changes.items():
+                totals[field] += count
+            await self._renew_lease()
+            if len(users) < self.page_size:
+                break
+            first += self.page_size
+
+        # Only after a complete scan: local users it didn't return were deleted in Keycloak, or
+        # skipped when deletions shifted the pages. Each is confirmed with a lookup by id.
+        changes = await self._apply_by_id(local_ids - seen)
+        for field, count in changes.items():
+            totals[field] += count
+
+        events_from = state["events_from"] if state else started_ms
+        return totals, {"events_from": events_from, "full_at": time.time()}
+
+    async def _changed_users(self, since_ms: int) -> tuple:
+        """
+        Map each user touched by an event at or after `since_ms` to its oldest
+        such event time, and return it with the newest event time seen.
+        """
+        # Keycloak filters by day; the exact cut is made on the event time
+        date_from = (datetime.fromtimestamp(since_ms / 1000, timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+        sources = (
+            (False, {"type": USER_EVENT_TYPES}, lambda event: event.get("userId")),
+            (True, {"resourceTypes": "USER", "operationTypes": ADMIN_OPERATION_TYPES}, _admin_event_user_id),
+        )
+
+        changed = {}
+        newest = since_ms
+        for admin, filters, user_id_of in sources:
+            first = 0
+            while True:
+                events = await get_events_keycloak(
+                    None, admin=admin, first=first, max_results=self.page_size, dateFrom=date_from, **filters
+                )
+                for event in events:
+                    event_time = event.get("time", 0)
+                    user_id = user_id_of(event)
+                    if event_time < since_ms or not user_id:
+                        continue
+                    changed[user_id] = min(changed.get(user_id, event_time), event_time)
+                    newest = max(newest, event_time)
+                await self._renew_lease()
+                # Events come newest first: stop at the first page reaching past the mark
+                if len(events) < self.page_size or events[-1].get("time", 0) < since_ms:
+                    break
+                first += self.page_size
+        return changed, newest
+
+    async def _event_sync(self, state: dict):
+        since_ms = state["events_from"]
+        changed, newest = await self._changed_users(since_ms)
+        if not changed:
+            return {"email_verified": 0, "deleted": 0}, state
+
+        changes = await self._apply_by_id(changed)
+
+        applied_at = time.time()
+        for event_time in changed.values():
+            # Events at the mark itself were already applied by the previous pass
+            if event_time > since_ms:
+                user_sync_event_lag.observe(max(applied_at - event_time / 1000, 0))
+        # The mark stays on the newest event time: events stored later in the same millisecond
+        # are read on the next pass, and applying the users read again is a no-op
+        return changes, {**state, "events_from": newest}
+
+
+user_sync = KeycloakUserSync(cache_backend)
@@ -0,0 +1,55 @@
+import asyncio
+import contextlib
+import logging
+import time
+from sqlalchemy import text
+
+from app.config import DB_POOL_SIZE, STARTUP_WARMUP_TIMEOUT, STARTUP_WARMUP_DB_CONNECTIONS
+from app.database import async_engine
+from app.services import keycloak_async_service
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_db_pool(connections: int):
+    """
+    Open `connections` pooled connections at once so they stay idle in the pool.
+    """
+    async with contextlib.AsyncExitStack() as stack:
+        opened = await asyncio.gather(*(stack.enter_async_context(async_engine.connect()) for _ in range(connections)))
+        await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in opened))
+
+
+async def _timed(name: str, coroutine) -> float:
+    started = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - started
+
+
+async def warm_up(timeout: float = STARTUP_WARMUP_TIMEOUT) -> dict:
+    """
+    Prefetch the JWKS, the service account token and DB connections so the
+    first requests of a fresh worker don't pay for them. Failures are logged
+    and returned, never raised: a worker still starts while Keycloak is down.
+    """
+    steps = {
+        "jwks": keycloak_async_service.get_keycloak_public_key(),
+        "service_account_token": keycloak_async_service.get_token(),
+        "db_pool": warm_db_pool(min(STARTUP_WARMUP_DB_CONNECTIONS, DB_POOL_SIZE)),
+    }
+    tasks = {name: asyncio.ensure_future(_timed(name, step)) for name, step in steps.items()}
+    await asyncio.wait(tasks.values(), timeout=timeout)
+
+    results = {}
+    for name, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            results[name] = "timeout"
+        elif task.exception() is not None:
+            results[name] = f"failed: {task.exception()}"
+        else:
+            results[name] = f"{task.result() * 1000:.0f}ms"
+
+        if results[name].startswith(("timeout", "failed")):
+            logger.warning("Warm-up of %s %s", name, results[name])
+    return results
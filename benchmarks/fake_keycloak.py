@@ -0,0 +1,234 @@
+"""
+In-process stand-in for the Keycloak OIDC and admin endpoints used by the app.
+
+Mints RS256 tokens, serves the JWKS and keeps admin-created users in memory.
+Every response is delayed by FAKE_KEYCLOAK_LATENCY_MS (+/- FAKE_KEYCLOAK_JITTER_MS)
+to emulate a remote Keycloak.
+
+    uvicorn benchmarks.fake_keycloak:app --port 8081
+"""
+import asyncio
+import base64
+import os
+import random
+import time
+import uuid
+from urllib.parse import parse_qsl
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt, JWTError
+
+SERVER_URL = os.environ.get("FAKE_KEYCLOAK_URL", "http://127.0.0.1:8081").rstrip("/")
+REALM = os.environ.get("FAKE_KEYCLOAK_REALM", "bench")
+CLIENT_ID = os.environ.get("FAKE_KEYCLOAK_CLIENT_ID", "bench-client")
+PASSWORD = os.environ.get("FAKE_KEYCLOAK_PASSWORD", "password")
+LATENCY_MS = float(os.environ.get("FAKE_KEYCLOAK_LATENCY_MS", 0))
+JITTER_MS = float(os.environ.get("FAKE_KEYCLOAK_JITTER_MS", 0))
+TOKEN_LIFETIME = int(os.environ.get("FAKE_KEYCLOAK_TOKEN_LIFETIME", 300))
+
+ISSUER = f"{SERVER_URL}/realms/{REALM}"
+KID = "bench-key"
+USER_NAMESPACE = uuid.UUID("6f0d8d3c-6f5e-4a8e-9d0b-8f1f4b9a2c11")
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_KEY_PEM = _private_key.private_bytes(
+    serialization.Encoding.PEM,
+    serialization.PrivateFormat.PKCS8,
+    serialization.NoEncryption(),
+).decode()
+# Constructed once: parsing the PEM on every jwt.encode costs more than the signature
+SIGNING_KEY = jwk.construct(PRIVATE_KEY_PEM, "RS256")
+
+
+def _b64_int(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+_public_numbers = _private_key.public_key().public_numbers()
+JWKS = {
+    "keys": [{
+        "kid": KID,
+        "kty": "RSA",
+        "alg": "RS256",
+        "use": "sig",
+        "n": _b64_int(_public_numbers.n),
+        "e": _b64_int(_public_numbers.e),
+    }]
+}
+
+# username -> admin representation of users created through the admin API
+users = {}
+
+
+def keycloak_id_for(username: str) -> str:
+    """
+    Deterministic Keycloak id of a user, so benchmarks can seed matching DB rows.
+    """
+    return str(uuid.uuid5(USER_NAMESPACE, username))
+
+
+def mint_token(sub: str, username: str, typ: str = "Bearer", lifetime: int = TOKEN_LIFETIME, sid: str = None) -> str:
+    now = int(time.time())
+    claims = {
+        "exp": now + lifetime,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "iss": ISSUER,
+        "sub": sub,
+        "typ": typ,
+        "azp": CLIENT_ID,
+        "sid": sid or str(uuid.uuid4()),
+        "preferred_username": username,
+        "email_verified": True,
+    }
+    return jwt.encode(claims, SIGNING_KEY, algorithm="RS256", headers={"kid": KID})
+
+
+def token_response(sub: str, username: str, sid: str = None) -> dict:
+    sid = sid or str(uuid.uuid4())
+    return {
+        "access_token": mint_token(sub, username, sid=sid),
+        "expires_in": TOKEN_LIFETIME,
+        "refresh_token": mint_token(sub, username, typ="Refresh", lifetime=TOKEN_LIFETIME * 6, sid=sid),
+        "refresh_expires_in": TOKEN_LIFETIME * 6,
+        "token_type": "Bearer",
+        "session_state": sid,
+        "scope": "profile email",
+    }
+
+
+def decode(token: str) -> dict:
+    return jwt.decode(token, JWKS["keys"][0], algorithms=["RS256"], options={"verify_aud": False})
+
+
+async def _form(request: Request) -> dict:
+    # Parsed by hand so the stand-in doesn't need python-multipart
+    return dict(parse_qsl((await request.body()).decode()))
+
+
+def _error(status_code: int, error: str) -> JSONResponse:
+    return JSONResponse({"error": error}, status_code=status_code)
+
+
+app = FastAPI(title="Fake Keycloak")
+
+
+@app.middleware("http")
+async def emulate_latency(request: Request, call_next):
+    if LATENCY_MS or JITTER_MS:
+        delay = LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)
+        await asyncio.sleep(max(delay, 0) / 1000)
+    return await call_next(request)
+
+
+oidc_path = f"/realms/{REALM}/protocol/openid-connect"
+admin_path = f"/admin/realms/{REALM}"
+
+
+@app.get(oidc_path + "/certs")
+async def certs():
+    return JWKS
+
+
+@app.post(oidc_path + "/token")
+async def token(request: Request):
+    form = await _form(request)
+    grant_type = form.get("grant_type")
+
+    if grant_type == "client_credentials":
+        username = f"service-account-{form.get('client_id') or CLIENT_ID}"
+        return token_response(keycloak_id_for(username), username)
+
+    if grant_type == "password":
+        username = form.get("username")
+        user = users.get(username)
+        expected = user["password"] if user else PASSWORD
+        if not username or form.get("password") != expected:
+            return _error(401, "invalid_grant")
+        sub = user["id"] if user else keycloak_id_for(username)
+        return token_response(sub, username)
+
+    if grant_type == "refresh_token":
+        try:
+            claims = decode(form.get("refresh_token", ""))
+        except JWTError:
+            return _error(400, "invalid_grant")
+        return token_response(claims["sub"], claims.get("preferred_username"), sid=claims.get("sid"))
+
+    return _error(400, "unsupported_grant_type")
+
+
+@app.post(oidc_path + "/token/introspect")
+async def introspect(request: Request):
+    form = await _form(request)
+    try:
+        claims = decode(form.get("token", ""))
+    except JWTError:
+        return {"active": False}
+    return {"active": True, "client_id": claims.get("azp"), "username": claims.get("preferred_username"), **claims}
+
+
+@app.post(oidc_path + "/logout")
+async def logout():
+    return Response(status_code=204)
+
+
+@app.get(admin_path + "/users")
+async def search_users(username: str = None, email: str = None):
+    return [
+        user["representation"] for user in users.values()
+        if (username and user["representation"]["username"] == username)
+        or (email and user["representation"].get("email") == email)
+    ]
+
+
+@app.post(admin_path + "/users")
+async def create_user(request: Request):
+    representation = await request.json()
+    username = representation["username"]
+    if username in users:
+        return _error(409, "User exists with same username")
+
+    keycloak_id = keycloak_id_for(username)
+    credentials = representation.pop("credentials", None) or [{}]
+    users[username] = {
+        "id": keycloak_id,
+        "password": credentials[0].get("value", PASSWORD),
+        "representation": {**representation, "id": keycloak_id},
+    }
+    return Response(status_code=201, headers={"Location": f"{SERVER_URL}{admin_path}/users/{keycloak_id}"})
+
+
+@app.post(admin_path + "/partialImport")
+async def partial_import(request: Request):
+    payload = await request.json()
+    results = []
+    for representation in payload.get("users", []):
+        username = representation["username"]
+        if username in users:
+            results.append({"action": "SKIPPED", "resourceName": username, "id": users[username]["id"]})
+            continue
+        keycloak_id = keycloak_id_for(username)
+        credentials = representation.pop("credentials", None) or [{}]
+        users[username] = {
+            "id": keycloak_id,
+            "password": credentials[0].get("value", PASSWORD),
+            "representation": {**representation, "id": keycloak_id},
+        }
+        results.append({"action": "ADDED", "resourceName": username, "id": keycloak_id})
+    return {"added": sum(r["action"] == "ADDED" for r in results), "results": results}
+
+
+@app.put(admin_path + "/users/{user_id}")
+@app.put(admin_path + "/users/{user_id}/reset-password")
+@app.put(admin_path + "/users/{user_id}/execute-actions-email")
+async def update_user(user_id: str):
+    return Response(status_code=204)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=int(SERVER_URL.rsplit(":", 1)[-1]))
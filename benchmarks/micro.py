@@ -0,0 +1,162 @@
+"""
+Micro-benchmarks of the per-request CPU work on the auth and user paths:
+JWT verification, `UserRead` serialization and the GET /users page path.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --users 1000
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(name: str, func, unit_count: int = 1):
+    """
+    Time `func` with `timeit` autoranging and print the best per-call cost.
+    """
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=loops)) / loops
+    per_unit = best / unit_count
+    print(f"{name:<48} {best * 1e6:>12.1f} us/call  {per_unit * 1e6:>10.2f} us/item  {1 / per_unit:>12.0f} items/s")
+
+
+def bench_jwt():
+    from jose import jwt
+    from app.services.jwks import JWKSKeyStore
+    from benchmarks import fake_keycloak
+
+    token = fake_keycloak.mint_token(str(uuid.uuid4()), "bench-user-0")
+    jwks = fake_keycloak.JWKS
+    store = JWKSKeyStore()
+    store.load(jwks)
+    key = store.lookup(fake_keycloak.KID)
+    options = {"verify_aud": False}
+
+    print("JWT")
+    measure("get_unverified_header", lambda: jwt.get_unverified_header(token))
+    measure("decode, JWK dict (key parsed per call)", lambda: jwt.decode(token, jwks["keys"][0], algorithms=["RS256"], options=options))
+    measure("decode, cached key from JWKSKeyStore", lambda: jwt.decode(token, key, algorithms=["RS256"], options=options))
+    measure("decode, no signature check", lambda: jwt.get_unverified_claims(token))
+
+
+def bench_user_read(count: int):
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from app.models.user import User
+    from app.schemas.user import UserRead
+
+    now = datetime.utcnow()
+    users = [
+        User(
+            id=uuid.uuid4(),
+            keycloak_id=uuid.uuid4(),
+            username=f"bench-user-{i}",
+            first_name="Bench",
+            last_name=str(i),
+            email=f"bench-user-{i}@example.com",
+            phone_number=f"+1555{i:07d}",
+            email_verified=True,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+    rows = [
+        (u.id, u.keycloak_id, u.username, u.first_name, u.last_name, u.email, u.phone_number,
+         u.email_verified, u.created_at, u.updated_at, u.deleted_at)
+        for u in users
+    ]
+    fields = ("id", "keycloak_id", "username", "first_name", "last_name", "email", "phone_number",
+              "email_verified", "created_at", "updated_at", "deleted_at")
+    adapter = TypeAdapter(list[UserRead])
+    models = [UserRead.model_validate(u) for u in users]
+
+    print(f"UserRead ({count} users)")
+    measure("model_validate per ORM object", lambda: [UserRead.model_validate(u) for u in users], count)
+    measure("TypeAdapter(list).validate_python, ORM", lambda: adapter.validate_python(users, from_attributes=True), count)
+    measure("TypeAdapter(list).validate_python, row dicts", lambda: adapter.validate_python([dict(zip(fields, r)) for r in rows]), count)
+    measure("jsonable_encoder (FastAPI response path)", lambda: jsonable_encoder(models), count)
+    measure("TypeAdapter(list).dump_json", lambda: adapter.dump_json(models), count)
+
+
+def bench_user_list(page_sizes):
+    """
+    GET /users serialization: ORM objects validated per item, re-validated as the
+    response model and encoded with the stdlib, against column rows validated once
+    as a list and dumped by pydantic-core.
+    """
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import Session
+    from app.crud.user import USER_READ_COLUMNS, dump_users_json, user_list_adapter
+    from app.database import Base
+    from app.models.user import User
+    from app.schemas.user import UserRead
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        session.add_all(
+            User(
+                id=uuid.uuid4(),
+                keycloak_id=uuid.uuid4(),
+                username=f"bench-user-{i}",
+                first_name="Bench",
+                last_name=str(i),
+                email=f"bench-user-{i}@example.com",
+                phone_number=f"+1555{i:07d}",
+                email_verified=True,
+                created_at=now,
+                updated_at=now,
+            )
+            for i in range(max(page_sizes))
+        )
+        session.commit()
+
+    def orm_path(size):
+        with Session(engine) as session:
+            users = session.execute(select(User).limit(size)).scalars().all()
+            models = [UserRead.model_validate(user) for user in users]
+            validated = user_list_adapter.validate_python(models, from_attributes=True)
+            return json.dumps(jsonable_encoder(validated)).encode()
+
+    def row_path(size):
+        with Session(engine) as session:
+            rows = session.execute(select(*USER_READ_COLUMNS).limit(size)).all()
+            return dump_users_json(rows)
+
+    print("GET /users page (query + serialization, in-memory SQLite)")
+    for size in page_sizes:
+        measure(f"ORM + model_validate + jsonable_encoder, {size}", lambda: orm_path(size), size)
+        measure(f"column rows + list adapter + dump_json, {size}", lambda: row_path(size), size)
+    engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="Users per serialization call")
+    parser.add_argument("--page-sizes", default="100,1000", help="Comma-separated GET /users page sizes")
+    args = parser.parse_args(argv)
+
+    # Models import the database module; nothing here connects to it
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("ASYNC_DATABASE_URL", "sqlite+aiosqlite://")
+    sys.path.insert(0, ROOT)
+
+    bench_jwt()
+    print()
+    bench_user_read(args.users)
+    print()
+    bench_user_list([int(size) for size in args.page_sizes.split(",")])
+
+
+if __name__ == "__main__":
+    main()
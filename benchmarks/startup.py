@@ -0,0 +1,128 @@
+"""
+Cold start of the app: time to `import main` in a fresh interpreter, its peak
+RSS, the modules that dominate the import, and optionally the time until a
+uvicorn server answers /health/ready.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 20 --top 25 --serve
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def startup_env() -> dict:
+    # Nothing is contacted at import time; the URLs only need to parse
+    return {
+        **os.environ,
+        "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite://"),
+        "ASYNC_DATABASE_URL": os.environ.get("ASYNC_DATABASE_URL", "sqlite+aiosqlite://"),
+        "PYTHONPATH": ROOT,
+    }
+
+
+def measure_import(runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=startup_env(),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    seconds = sorted(sample["seconds"] for sample in samples)
+    return {
+        "runs": runs,
+        "median_ms": statistics.median(seconds) * 1000,
+        "min_ms": seconds[0] * 1000,
+        "max_rss_kb": max(sample["max_rss_kb"] for sample in samples),
+        "modules": samples[-1]["modules"],
+    }
+
+
+def import_offenders(top: int) -> list:
+    """
+    Top-level packages by cumulative import time, from `-X importtime`.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=startup_env(),
+        capture_output=True, text=True, check=True,
+    ).stderr
+
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue
+        package = name.split(".")[0]
+        # The outermost import of a package carries the cumulative time of all its submodules
+        if name == package or package not in packages:
+            packages[package] = max(packages.get(package, 0), int(cumulative))
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure_time_to_ready(port: int, timeout: float = 60) -> float:
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env={**startup_env(), "STARTUP_WARMUP_TIMEOUT": "5", "USER_SYNC_ENABLED": "false"})
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health/ready", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f"The app was not ready within {timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters timed for `import main`")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    parser.add_argument("--serve", action="store_true", help="Also time a uvicorn start until /health/ready")
+    parser.add_argument("--port", type=int, default=8092)
+    args = parser.parse_args(argv)
+
+    result = measure_import(args.runs)
+    print(
+        f"import main: median={result['median_ms']:.0f}ms  min={result['min_ms']:.0f}ms  "
+        f"max_rss={result['max_rss_kb'] / 1024:.1f}MiB  modules={result['modules']}  ({args.runs} runs)"
+    )
+
+    print("\nSlowest imports (cumulative, one run)")
+    for package, microseconds in import_offenders(args.top):
+        print(f"{package:<32} {microseconds / 1000:>8.1f}ms")
+
+    if args.serve:
+        print(f"\ntime to ready: {measure_time_to_ready(args.port) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,48 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.config import STARTUP_WARMUP, USER_SYNC_ENABLED
+from app.database import async_engine, async_replicas, get_pool_stats
 from app.routes import user, auth, role
+from app.services import keycloak_async_service
+from app.services.cache import cache_backend
+from app.services.revocation import revocation_index
+from app.services.metrics import MetricsMiddleware, render_metrics
+from app.services.user_sync import user_sync
+from app.services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Receive cache invalidations and revocations published by other workers
+    await cache_backend.start()
+    revocation_index.start()
+    # Fetch keys, tokens and connections before reporting ready
+    if STARTUP_WARMUP:
+        app.state.warmup = await warm_up()
+    # Converge email verification and deletions made in Keycloak into the database
+    sync_task = asyncio.create_task(user_sync.run()) if USER_SYNC_ENABLED else None
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    if sync_task is not None:
+        sync_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await sync_task
+    # Close pooled Keycloak, cache and database connections on shutdown
+    await keycloak_async_service.keycloak_client.aclose()
+    await cache_backend.close()
+    await async_engine.dispose()
+    for replica in async_replicas.engines:
+        await replica.dispose()
+
 
 # Create the FastAPI app instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.state.ready = False
+app.state.warmup = {}
 
 # CORS middleware to allow cross-origin requests (adjust as necessary)
 app.add_middleware(
@@ -12,8 +51,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers read the conditional request and paging headers
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor"],
 )
 
+# Per-route latency and status metrics, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include the user routes in the FastAPI app
 app.include_router(user.router)
 app.include_router(auth.router)
@@ -23,6 +67,20 @@ app.include_router(role.router)
 def read_root():
     return {"message": "Welcome to the User Management API!"}
 
+@app.get("/health/db-pool", tags=["Default"])
+def db_pool_stats():
+    return get_pool_stats()
+
+@app.get("/health/ready", tags=["Default"])
+def readiness(response: Response):
+    if not app.state.ready:
+        response.status_code = 503
+    return {"ready": app.state.ready, "warmup": app.state.warmup}
+
+@app.get("/metrics", tags=["Default"], include_in_schema=False)
+def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app)
\ No newline at end of file
@@ -95,4 +95,34 @@ CREATE TABLE public.user_role_link (
 	CONSTRAINT user_role_unique UNIQUE (user_id, role_id),
 	CONSTRAINT user_role_link_role_id_fkey FOREIGN KEY (role_id) REFERENCES public."role"(id),
 	CONSTRAINT user_role_link_user_id_fkey FOREIGN KEY (user_id) REFERENCES public."user"(id)
-);
\ No newline at end of file
+);
+
+-- Keyset pagination over non-deleted users (GET /users)
+
+CREATE INDEX ix_user_active_created_at_id ON public."user" USING btree (created_at, id) WHERE deleted_at IS NULL;
+
+-- User search (GET /users/search): trigram index for substring and fuzzy matches over non-deleted users
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX ix_user_search_trgm ON public."user" USING gin (lower(username || ' ' || first_name || ' ' || last_name || ' ' || email || ' ' || phone_number) gin_trgm_ops) WHERE deleted_at IS NULL;
+
+-- Seed data: the capabilities checked by the API and an admin role holding all of them.
+-- Grant it to the first administrator with the service account (see README, Authorization).
+
+INSERT INTO public.capability ("name", description) VALUES
+	('users:read', 'Read users'),
+	('users:write', 'Create, update and delete users'),
+	('roles:write', 'Assign roles to users')
+ON CONFLICT ("name") DO NOTHING;
+
+INSERT INTO public."role" ("name", description) VALUES
+	('admin', 'Full access to users and role assignments')
+ON CONFLICT ("name") DO NOTHING;
+
+INSERT INTO public.role_capability_link (role_id, capability_id)
+SELECT r.id, c.id
+FROM public."role" r
+CROSS JOIN public.capability c
+WHERE r."name" = 'admin' AND c."name" IN ('users:read', 'users:write', 'roles:write')
+ON CONFLICT ON CONSTRAINT role_capability_unique DO NOTHING;
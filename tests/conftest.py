@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+# Settings are read at import time: point the app at a throwaway SQLite database
+# and keep background work and upstream calls off before anything imports app.config
+_database = os.path.join(tempfile.mkdtemp(prefix="users-tests-"), "test.db")
+os.environ.update(
+    {
+        "DATABASE_URL": f"sqlite:///{_database}",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{_database}",
+        "KEYCLOAK_SERVER_URL": "http://keycloak.test",
+        "KEYCLOAK_REALM": "test",
+        "KEYCLOAK_CLIENT_ID": "users-service",
+        "KEYCLOAK_CLIENT_SECRET": "secret",
+        "STARTUP_WARMUP": "false",
+        "USER_SYNC_ENABLED": "false",
+    }
+)
+os.environ.pop("CACHE_BACKEND_URL", None)
+os.environ.pop("LOGIN_RATE_LIMIT_REDIS_URL", None)
+
+
+class FakeClock:
+    """
+    Stand-in for the `time` module of a service, advanced by hand.
+    """
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
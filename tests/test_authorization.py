@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import delete
+
+from app.database import AsyncSessionLocal, Base, async_engine, engine
+from app.models.user import Capability, Role, RoleCapability, User, UserRole
+from app.services import authorization
+from app.services.authorization import PermissionCache, capability_index, get_capability_mask
+from app.services.cache import InMemoryRedis, RedisCacheBackend
+
+
+@pytest.fixture
+def tables():
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+async def _grant(keycloak_id: uuid.UUID, capability_name: str):
+    async with AsyncSessionLocal() as session:
+        user = User(
+            id=uuid.uuid4(),
+            keycloak_id=keycloak_id,
+            username="alice",
+            first_name="Alice",
+            last_name="Doe",
+            email="alice@example.com",
+            phone_number="+100",
+        )
+        role = Role(id=uuid.uuid4(), name="admin", description="Admin")
+        capability = Capability(id=uuid.uuid4(), name=capability_name, description=capability_name)
+        session.add_all([user, role, capability])
+        await session.flush()
+        session.add_all(
+            [
+                UserRole(id=uuid.uuid4(), user_id=user.id, role_id=role.id),
+                RoleCapability(id=uuid.uuid4(), role_id=role.id, capability_id=capability.id),
+            ]
+        )
+        await session.commit()
+        return role.id
+
+
+def test_role_changes_invalidate_cached_capabilities(tables):
+    keycloak_id = uuid.uuid4()
+    required = capability_index.mask(["users:write"])
+
+    async def scenario():
+        role_id = await _grant(keycloak_id, "users:write")
+        async with AsyncSessionLocal() as session:
+            granted = await get_capability_mask(session, str(keycloak_id))
+        assert authorization.permission_cache.get(str(keycloak_id)) == granted
+
+        # Revoke the role through the ORM; the cache must not keep the old mask
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(UserRole).where(UserRole.role_id == role_id))
+            await session.commit()
+        cached = authorization.permission_cache.get(str(keycloak_id))
+
+        async with AsyncSessionLocal() as session:
+            revoked = await get_capability_mask(session, str(keycloak_id))
+        await async_engine.dispose()
+        return granted, cached, revoked
+
+    granted, cached, revoked = asyncio.run(scenario())
+    assert granted & required == required
+    assert cached is None
+    assert revoked & required == 0
+
+
+def test_invalidations_reach_other_workers():
+    async def scenario():
+        client = InMemoryRedis()
+        first, second = RedisCacheBackend(client), RedisCacheBackend(client)
+        committing, other = PermissionCache(first), PermissionCache(second)
+        await first.start()
+        await second.start()
+        try:
+            other.set("user-1", 0b11, other.version)
+            other.set("user-2", 0b01, other.version)
+
+            committing.invalidate("user-1")
+            await asyncio.sleep(0.05)
+            one = (other.get("user-1"), other.get("user-2"))
+
+            committing.invalidate()
+            await asyncio.sleep(0.05)
+            return one, other.get("user-2")
+        finally:
+            await first.close()
+            await second.close()
+
+    (user_1, user_2), after_clear = asyncio.run(scenario())
+    assert user_1 is None
+    assert user_2 == 0b01
+    assert after_clear is None
+
+
+def test_mask_loaded_during_an_invalidation_is_not_cached():
+    cache = PermissionCache(RedisCacheBackend(InMemoryRedis()))
+    version = cache.version
+    cache.invalidate("user-1")
+    cache.set("user-1", 0b1, version)
+    assert cache.get("user-1") is None
+
+
+def test_no_service_account_is_trusted_by_default():
+    assert authorization.AUTHZ_SERVICE_ACCOUNT_CLIENTS == []
+    assert not authorization.is_trusted_service_account(
+        {"azp": "users-service", "preferred_username": "service-account-users-service"}
+    )
+
+
+def test_only_configured_service_accounts_are_trusted(monkeypatch):
+    monkeypatch.setattr(authorization, "AUTHZ_SERVICE_ACCOUNT_CLIENTS", ["users-service"])
+    assert authorization.is_trusted_service_account(
+        {"azp": "users-service", "preferred_username": "service-account-users-service"}
+    )
+    # A user logging in through the same client
+    assert not authorization.is_trusted_service_account({"azp": "users-service", "preferred_username": "alice"})
+    assert not authorization.is_trusted_service_account(
+        {"azp": "other-client", "preferred_username": "service-account-other-client"}
+    )
@@ -0,0 +1,87 @@
+import asyncio
+
+from app.services.cache import Cache, InMemoryRedis, InProcessCacheBackend, RedisCacheBackend
+
+
+async def _shared_backends(count: int = 2):
+    client = InMemoryRedis()
+    backends = [RedisCacheBackend(client) for _ in range(count)]
+    return backends
+
+
+def test_get_or_compute_runs_once_across_workers():
+    async def scenario():
+        first, second = await _shared_backends()
+        caches = [Cache(first, "users", ttl=60), Cache(second, "users", ttl=60)]
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {"value": 42}
+
+        results = await asyncio.gather(
+            *(cache.get_or_compute("key", compute) for cache in caches for _ in range(3))
+        )
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 6
+
+
+def test_delete_drops_near_copies_in_other_workers():
+    async def scenario():
+        first, second = await _shared_backends()
+        writer, reader = Cache(first, "users", ttl=60), Cache(second, "users", ttl=60)
+        await first.start()
+        await second.start()
+        try:
+            await writer.set("key", "v1")
+            assert await reader.get("key") == "v1"
+            assert reader.local.get("users:key") == "v1"
+
+            await writer.delete("key")
+            await asyncio.sleep(0.05)
+            return reader.local.get("users:key"), await reader.get("key")
+        finally:
+            await first.close()
+            await second.close()
+
+    near_copy, value = asyncio.run(scenario())
+    assert near_copy is None
+    assert value is None
+
+
+def test_none_is_cached_for_the_negative_ttl():
+    async def scenario():
+        cache = Cache(InProcessCacheBackend(), "status", ttl=60, negative_ttl=0.1)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return None
+
+        assert await cache.get_or_compute("missing", compute) is None
+        assert await cache.get_or_compute("missing", compute) is None
+        cached_calls = len(calls)
+        await asyncio.sleep(0.15)
+        await cache.get_or_compute("missing", compute)
+        return cached_calls, len(calls)
+
+    cached_calls, total_calls = asyncio.run(scenario())
+    assert cached_calls == 1
+    assert total_calls == 2
+
+
+def test_renew_only_extends_a_key_that_still_holds_the_value():
+    async def scenario(backend):
+        await backend.add("lease", "worker-1", ttl=10)
+        return (
+            await backend.renew("lease", "worker-1", ttl=10),
+            await backend.renew("lease", "worker-2", ttl=10),
+            await backend.renew("missing", "worker-1", ttl=10),
+        )
+
+    for backend in (InProcessCacheBackend(), RedisCacheBackend(InMemoryRedis())):
+        assert asyncio.run(scenario(backend)) == (True, False, False)
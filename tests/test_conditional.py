@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from app.services.conditional import etag_matches, etag_matches_strong, not_modified, updated_at_etag
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+
+def test_user_etag_is_strong_and_changes_with_updated_at():
+    etag = updated_at_etag(UPDATED_AT)
+    assert not etag.startswith("W/")
+    assert etag != updated_at_etag(UPDATED_AT.replace(microsecond=123457))
+
+
+def test_if_match_uses_strong_comparison():
+    etag = updated_at_etag(UPDATED_AT)
+    assert etag_matches_strong(etag, etag)
+    assert etag_matches_strong(f'"other", {etag}', etag)
+    assert etag_matches_strong("*", etag)
+    assert not etag_matches_strong(f"W/{etag}", etag)
+    assert not etag_matches_strong('W/"abc"', 'W/"abc"')
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = updated_at_etag(UPDATED_AT)
+    assert etag_matches(f"W/{etag}", etag)
+    assert not_modified(etag, None, etag, UPDATED_AT)
+    assert not not_modified('"other"', None, etag, UPDATED_AT)
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import ReplicaSession, ReplicaSet
+
+
+def _engine(path: str):
+    return create_engine(f"sqlite:///{path}")
+
+
+def test_replica_is_chosen_lazily_and_falls_back_to_the_primary():
+    directory = tempfile.mkdtemp(prefix="replicas-")
+    primary = _engine(os.path.join(directory, "primary.db"))
+    unreachable = _engine(os.path.join(directory, "missing", "replica.db"))
+    healthy = _engine(os.path.join(directory, "replica.db"))
+
+    class ReadSession(ReplicaSession):
+        replica_set = ReplicaSet([unreachable, healthy], retry_interval=60)
+
+    Sessions = sessionmaker(bind=primary, class_=ReadSession)
+
+    # No connection is checked out until the session runs a query
+    with Sessions() as session:
+        assert "replica" not in session.info
+    assert unreachable.pool.checkedout() == healthy.pool.checkedout() == 0
+
+    # The first pick can't connect: that read goes to the primary and the replica is skipped afterwards
+    with Sessions() as session:
+        assert session.execute(text("SELECT 1")).scalar() == 1
+        assert session.get_bind() is primary
+    for _ in range(3):
+        with Sessions() as session:
+            session.execute(text("SELECT 1"))
+            assert session.get_bind() is healthy
+
+
+def test_async_sessions_probe_the_replica_in_their_greenlet():
+    directory = tempfile.mkdtemp(prefix="replicas-")
+    primary = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'primary.db')}")
+    unreachable = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'missing', 'replica.db')}")
+
+    class ReadSession(ReplicaSession):
+        replica_set = ReplicaSet([unreachable], retry_interval=60)
+
+    Sessions = async_sessionmaker(primary, sync_session_class=ReadSession)
+
+    async def scenario():
+        async with Sessions() as session:
+            value = (await session.execute(text("SELECT 1"))).scalar()
+            return value, session.sync_session.get_bind()
+
+    value, bind = asyncio.run(scenario())
+    assert value == 1
+    assert bind is primary.sync_engine
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.services import rate_limit
+from app.services.rate_limit import InMemoryRateLimitBackend, LoginRateLimiter, RateLimitPolicy
+from conftest import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def test_bucket_rejects_when_empty_and_refills_over_time(clock):
+    backend = InMemoryRateLimitBackend()
+
+    async def take():
+        return await backend.take("key", burst=2, rate=0.5)
+
+    assert asyncio.run(take()) == 0
+    assert asyncio.run(take()) == 0
+    assert asyncio.run(take()) == pytest.approx(2.0)
+
+    clock.advance(1)
+    assert asyncio.run(take()) == pytest.approx(1.0)
+    clock.advance(1)
+    assert asyncio.run(take()) == 0
+
+
+def test_bucket_never_refills_past_burst(clock):
+    backend = InMemoryRateLimitBackend()
+
+    async def drain():
+        allowed = 0
+        while not await backend.take("key", burst=3, rate=1):
+            allowed += 1
+        return allowed
+
+    asyncio.run(drain())
+    clock.advance(3600)
+    assert asyncio.run(drain()) == 3
+
+
+def _limiter():
+    return LoginRateLimiter(
+        InMemoryRateLimitBackend(),
+        username_policy=RateLimitPolicy("login:user", burst=5, per_minute=5),
+        ip_policy=RateLimitPolicy("login:ip", burst=20, per_minute=60),
+    )
+
+
+def test_attacker_ip_cannot_lock_the_owner_out(clock):
+    limiter = _limiter()
+
+    async def scenario():
+        attacker = [await limiter.check("victim", "203.0.113.9") for _ in range(50)]
+        owner = await limiter.check("Victim", "198.51.100.1")
+        return attacker, owner
+
+    attacker, owner = asyncio.run(scenario())
+    assert sum(1 for wait in attacker if not wait) == 5
+    assert owner == 0
+
+
+def test_ip_rejection_does_not_charge_the_username(clock):
+    limiter = _limiter()
+
+    async def scenario():
+        # Use up the IP bucket on other usernames, then try the victim from that IP
+        for i in range(20):
+            assert not await limiter.check(f"user-{i}", "203.0.113.9")
+        for _ in range(10):
+            assert await limiter.check("victim", "203.0.113.9")
+        return await limiter.backend.take("login:user:victim@203.0.113.9", burst=5, rate=5 / 60, cost=5)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_many_ips_cannot_lock_the_owner_out(clock):
+    limiter = _limiter()
+
+    async def scenario():
+        for i in range(200):
+            await limiter.check("victim", f"203.0.113.{i // 5}")
+        return await limiter.check("victim", "198.51.100.1")
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+
+from app.services import revocation
+from app.services.cache import InMemoryRedis, InProcessCacheBackend, RedisCacheBackend
+from app.services.revocation import BloomFilter, RevocationIndex
+from conftest import FakeClock
+
+
+def _token(**claims) -> str:
+    return jwt.encode(claims, "secret", algorithm="HS256")
+
+
+def test_logout_revokes_the_session():
+    index = RevocationIndex(InProcessCacheBackend())
+    refresh_token = _token(sid="session-1", jti="refresh-1", exp=time.time() + 1800)
+
+    assert asyncio.run(index.revoke_token(refresh_token, session_lifetime=300))
+
+    # Access tokens of the session
+    assert index.is_revoked({"sid": "session-1", "jti": "access-1"})
+    assert not index.is_revoked({"sid": "session-2", "jti": "access-2"})
+
+
+def test_a_token_without_sid_revokes_nothing():
+    index = RevocationIndex(InProcessCacheBackend())
+    refresh_token = _token(jti="refresh-1", exp=time.time() + 1800)
+
+    assert not asyncio.run(index.revoke_token(refresh_token, session_lifetime=300))
+    assert len(index) == 0
+
+
+def test_entries_expire_a_bucket_at_a_time(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(revocation, "time", clock)
+    index = RevocationIndex(InProcessCacheBackend(), bucket_seconds=60)
+
+    index.add("sid:short", clock.now + 30)
+    index.add("sid:long", clock.now + 600)
+    assert len(index) == 2
+
+    clock.advance(31)
+    assert not index.is_revoked({"sid": "short"})
+    assert index.is_revoked({"sid": "long"})
+
+    clock.advance(120)
+    index.is_revoked({})
+    assert len(index) == 1
+
+
+def test_bloom_false_positives_are_confirmed_in_the_index():
+    # A tiny filter with every bit set answers "maybe" for any key
+    index = RevocationIndex(InProcessCacheBackend(), bloom_bits=8, bloom_hashes=1)
+    for i in range(64):
+        index.add(f"sid:revoked-{i}", time.time() + 300)
+
+    assert "sid:never-revoked" in index._bloom
+    assert not index.is_revoked({"sid": "never-revoked"})
+    assert index.is_revoked({"sid": "revoked-7"})
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1 << 16, 4)
+    keys = [f"jti:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+
+def test_revocations_reach_other_workers_and_late_starters():
+    async def scenario():
+        client = InMemoryRedis()
+        first, second = RedisCacheBackend(client), RedisCacheBackend(client)
+        logout_worker, other_worker = RevocationIndex(first), RevocationIndex(second)
+        for backend, index in ((first, logout_worker), (second, other_worker)):
+            await backend.start()
+            index.start()
+
+        issued_at = time.time() - 10
+        await logout_worker.revoke("sid", "session-1", time.time() + 300)
+        await asyncio.sleep(0.05)
+        replicated = other_worker.is_revoked({"sid": "session-1"})
+
+        # A worker started after the logout missed the message but finds the stored entry
+        late = RedisCacheBackend(client)
+        late_worker = RevocationIndex(late)
+        await late.start()
+        late_worker.start()
+        missed = late_worker.is_revoked({"sid": "session-1"})
+        found = await late_worker.is_revoked_async({"sid": "session-1", "iat": issued_at})
+
+        for backend in (first, second, late):
+            await backend.close()
+        return replicated, missed, found
+
+    replicated, missed, found = asyncio.run(scenario())
+    assert replicated
+    assert not missed
+    assert found
+
+
+@pytest.mark.parametrize("mode", ["local", "introspect"])
+def test_validation_rejects_tokens_of_revoked_sessions(monkeypatch, mode):
+    from app.services import token_validation
+
+    async def active(token):
+        return {"active": True, "sub": "user-1", "sid": "logged-out", "iat": time.time()}
+
+    monkeypatch.setattr(token_validation, "validate_token_locally_async", active)
+    monkeypatch.setattr(token_validation, "introspect_token_async", active)
+    monkeypatch.setattr(token_validation, "revocation_index", RevocationIndex(InProcessCacheBackend()))
+
+    assert asyncio.run(token_validation.validate_token_async("token", mode=mode))["active"]
+    token_validation.revocation_index.add("sid:logged-out", time.time() + 300)
+    assert asyncio.run(token_validation.validate_token_async("token", mode=mode)) == {"active": False}
@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import user_loader
+from app.services.user_loader import UserLoader
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """
+    Replace the `= ANY(:ids)` query (PostgreSQL only) with a stub that returns
+    every other requested id as a found user and records each batch.
+    """
+    batches = []
+
+    async def get_users_by_ids_async(session, ids, key="id"):
+        batches.append(list(ids))
+        await asyncio.sleep(0.01)
+        return [SimpleNamespace(**{key: user_id}) for user_id in ids[::2]]
+
+    monkeypatch.setattr(user_loader, "get_users_by_ids_async", get_users_by_ids_async)
+    return batches
+
+
+def test_loads_in_one_iteration_share_a_query(queries):
+    ids = [uuid.uuid4() for _ in range(5)]
+
+    async def scenario():
+        loader = UserLoader(session=None)
+        return await asyncio.gather(*(loader.load(user_id) for user_id in ids + ids[:2]))
+
+    results = asyncio.run(scenario())
+    assert queries == [ids]
+    assert [result is not None for result in results] == [True, False, True, False, True, True, False]
+
+
+def test_batches_are_split_at_the_max_batch_size(queries):
+    ids = [uuid.uuid4() for _ in range(5)]
+
+    async def scenario():
+        return await UserLoader(session=None, max_batch_size=2).load_many(ids)
+
+    asyncio.run(scenario())
+    assert queries == [ids[:2], ids[2:4], ids[4:]]
+
+
+def test_results_are_cached_until_cleared(queries):
+    user_id = uuid.uuid4()
+
+    async def scenario():
+        loader = UserLoader(session=None)
+        await loader.load(user_id)
+        await loader.load(user_id)
+        loader.clear(user_id)
+        await loader.load(user_id)
+
+    asyncio.run(scenario())
+    assert queries == [[user_id], [user_id]]
+
+
+def test_clear_keeps_loads_in_flight(queries):
+    user_id = uuid.uuid4()
+
+    async def scenario():
+        loader = UserLoader(session=None)
+        pending = loader.load(user_id)
+        await asyncio.sleep(0)
+        loader.clear(user_id)
+        loader.clear()
+        return await asyncio.wait_for(pending, timeout=1)
+
+    assert asyncio.run(scenario()) is not None
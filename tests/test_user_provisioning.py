@@ -0,0 +1,153 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.schemas.user import UserCreate, UserRead
+from app.services import user_provisioning
+
+
+def make_user(name: str) -> UserCreate:
+    return UserCreate(
+        username=name,
+        first_name=name,
+        last_name=name,
+        email=f"{name}@example.com",
+        phone_number=f"+1555{name}",
+        password="secret",
+    )
+
+
+@pytest.fixture
+def keycloak(monkeypatch):
+    """
+    Stub the Keycloak calls: users get a new id unless listed in "existing",
+    deletions are recorded.
+    """
+    calls = {"ids": {}, "existing": set(), "deleted": [], "fail_delete": False}
+
+    async def get_token():
+        return {"access_token": "token"}
+
+    async def create_or_enable_user_keycloak(token, payload):
+        keycloak_id = calls["ids"].setdefault(payload["username"], str(uuid.uuid4()))
+        return keycloak_id, payload["username"] not in calls["existing"]
+
+    async def delete_user_keycloak(token, keycloak_id):
+        if calls["fail_delete"]:
+            raise Exception("Keycloak is down")
+        calls["deleted"].append(keycloak_id)
+
+    async def send_email_verification_link(token, keycloak_id):
+        return 204
+
+    for name, stub in (
+        ("get_token", get_token),
+        ("create_or_enable_user_keycloak", create_or_enable_user_keycloak),
+        ("delete_user_keycloak", delete_user_keycloak),
+        ("send_email_verification_link", send_email_verification_link),
+    ):
+        monkeypatch.setattr(user_provisioning, name, stub)
+    return calls
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """
+    Stub the multi-row INSERT: "taken" records are rejected, "existing" ones
+    already exist and a "race" record fails the whole INSERT.
+    """
+    async def bulk_create_users_async(session, rows):
+        if any(row["username"] == "race" for row in rows):
+            raise IntegrityError("INSERT INTO user", {}, Exception("duplicate key value"))
+        created, rejected = {}, {}
+        for row in rows:
+            keycloak_id = str(row["keycloak_id"])
+            if row["username"] == "taken":
+                rejected[keycloak_id] = "Phone number already in use"
+            elif row["username"] != "existing":
+                now = datetime.now()
+                created[keycloak_id] = UserRead(
+                    id=uuid.uuid4(), email_verified=False, created_at=now, updated_at=now, **row
+                )
+        return created, rejected
+
+    monkeypatch.setattr(user_provisioning, "bulk_create_users_async", bulk_create_users_async)
+
+
+def test_rejected_records_are_removed_from_keycloak(keycloak, database):
+    users = [make_user(name) for name in ("alice", "taken", "existing")]
+
+    results = asyncio.run(user_provisioning.bulk_create_users(None, users))
+
+    assert [result.success for result in results] == [True, False, False]
+    assert results[1].error == "Phone number already in use"
+    assert results[2].error == "User already exists"
+    # Only the rejected record's Keycloak user is rolled back
+    assert keycloak["deleted"] == [keycloak["ids"]["taken"]]
+
+
+def test_existing_keycloak_users_are_never_deleted(keycloak, database):
+    keycloak["existing"].add("taken")
+
+    results = asyncio.run(user_provisioning.bulk_create_users(None, [make_user("taken")]))
+
+    assert results[0].error == "Phone number already in use"
+    assert keycloak["deleted"] == []
+
+
+def test_failed_rollback_reports_the_orphaned_keycloak_user(keycloak, database):
+    keycloak["fail_delete"] = True
+
+    results = asyncio.run(user_provisioning.bulk_create_users(None, [make_user("taken")]))
+
+    assert not results[0].success
+    assert keycloak["ids"]["taken"] in results[0].error
+    assert "could not be removed" in results[0].error
+
+
+class FakeSession:
+    def __init__(self):
+        self.rolled_back = False
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+def test_a_failed_insert_rolls_back_every_new_keycloak_user(keycloak, database):
+    keycloak["existing"].add("bob")
+    session = FakeSession()
+
+    users = [make_user(name) for name in ("alice", "bob", "race")]
+
+    results = asyncio.run(user_provisioning.bulk_create_users(session, users))
+
+    assert session.rolled_back
+    assert not any(result.success for result in results)
+    assert all("retry" in result.error for result in results)
+    assert sorted(keycloak["deleted"]) == sorted([keycloak["ids"]["alice"], keycloak["ids"]["race"]])
+
+
+def test_partial_import_matches_lowercase_usernames(keycloak, database, monkeypatch):
+    async def partial_import_users_keycloak(token, payloads):
+        return [
+            {
+                "resourceType": "USER",
+                "action": "ADDED",
+                "resourceName": payload["username"].lower(),
+                "id": str(uuid.uuid4()),
+            }
+            for payload in payloads
+        ]
+
+    monkeypatch.setattr(user_provisioning, "partial_import_users_keycloak", partial_import_users_keycloak)
+
+    results = asyncio.run(
+        user_provisioning.bulk_create_users(None, [make_user("Alice")], use_partial_import=True)
+    )
+
+    assert results[0].success
+    # The imported user isn't looked up and given a new password again
+    assert keycloak["ids"] == {}
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services import user_sync
+from app.services.cache import InMemoryRedis, RedisCacheBackend
+from app.services.user_sync import KeycloakUserSync
+
+
+@pytest.fixture
+def keycloak(monkeypatch):
+    """
+    Stub Keycloak and the database: `events` are returned newest first,
+    `applied` records every batch of user states.
+    """
+    calls = {"events": [], "applied": [], "on_page": None}
+
+    async def get_events_keycloak(token, admin=False, first=0, max_results=100, **filters):
+        if calls["on_page"]:
+            await calls["on_page"]()
+        return [] if admin else calls["events"][first:first + max_results]
+
+    async def get_user_by_id_keycloak(token, user_id):
+        return {"id": user_id, "emailVerified": True}
+
+    async def apply_keycloak_user_states_async(session, states):
+        calls["applied"].append(sorted(states))
+        return {"email_verified": len(states), "deleted": 0}
+
+    monkeypatch.setattr(user_sync, "get_events_keycloak", get_events_keycloak)
+    monkeypatch.setattr(user_sync, "get_user_by_id_keycloak", get_user_by_id_keycloak)
+    monkeypatch.setattr(user_sync, "apply_keycloak_user_states_async", apply_keycloak_user_states_async)
+    return calls
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def make_sync(backend, **kwargs) -> KeycloakUserSync:
+    return KeycloakUserSync(backend, session_factory=FakeSession, full_interval=0, workers=1, **kwargs)
+
+
+def test_events_in_the_same_millisecond_as_the_mark_are_not_skipped(keycloak):
+    backend = RedisCacheBackend(InMemoryRedis())
+    sync = make_sync(backend)
+
+    async def scenario():
+        await backend.set(KeycloakUserSync.STATE_KEY, {"events_from": 1000, "full_at": 0}, 60)
+        keycloak["events"] = [{"time": 2000, "userId": "alice"}]
+        await sync.sync_once()
+        # Stored after the first pass read the events, with the same timestamp
+        keycloak["events"] = [{"time": 2000, "userId": "bob"}, {"time": 2000, "userId": "alice"}]
+        await sync.sync_once()
+        return await backend.get(KeycloakUserSync.STATE_KEY)
+
+    state = asyncio.run(scenario())
+    assert keycloak["applied"] == [["alice"], ["alice", "bob"]]
+    assert state["events_from"] == 2000
+
+
+def test_a_worker_that_loses_the_lease_stores_no_state(keycloak):
+    client = InMemoryRedis()
+    backend = RedisCacheBackend(client)
+    sync = make_sync(backend)
+    other = make_sync(RedisCacheBackend(client))
+
+    async def take_lease():
+        # The lease expired mid-pass and another worker took it
+        await backend.delete(KeycloakUserSync.LEASE_KEY)
+        await other._hold_lease()
+
+    async def scenario():
+        await backend.set(KeycloakUserSync.STATE_KEY, {"events_from": 1000, "full_at": 0}, 60)
+        keycloak["events"] = [{"time": 2000, "userId": "alice"}]
+        keycloak["on_page"] = take_lease
+        changes = await sync.sync_once()
+        return changes, await backend.get(KeycloakUserSync.STATE_KEY)
+
+    changes, state = asyncio.run(scenario())
+    assert changes == {}
+    assert state["events_from"] == 1000
+    assert not asyncio.run(sync._hold_lease())